@@ -1,7 +1,8 @@
 import os
 import logging
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, send_file, abort, Response
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 import uuid
 import time
 from pathlib import Path
@@ -9,7 +10,12 @@ from pathlib import Path
 # Import utility modules
 from utils.video_processor import process_video
 from utils.commentary_generator import generate_commentary
-from utils.text_to_speech import text_to_speech
+from utils.jobs import JobQueue
+from utils.result_cache import ResultCache, hash_file, link_or_copy, remember_hash
+from utils.uploads import UploadManager, UploadError, UploadOffsetError
+from utils.shot_classification import get_classifier
+from models import db, save_result, load_result
+from utils import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -46,6 +52,22 @@ app.config['RESULTS_FOLDER'] = RESULTS_FOLDER
 app.config['SAMPLE_FOLDER'] = SAMPLE_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max upload size
 
+# Resumable uploads; the 500MB limit applies to the whole file, not each chunk
+upload_manager = UploadManager(UPLOAD_FOLDER / 'partial', max_size=app.config['MAX_CONTENT_LENGTH'])
+
+# Processing results are kept server-side; the session cookie only holds the job id
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", "sqlite:///results.db")
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_pre_ping': True}
+db.init_app(app)
+with app.app_context():
+    db.create_all()
+
+# Background workers for video processing
+job_queue = JobQueue()
+
+# Finished results keyed by video content, language and model version
+result_cache = ResultCache()
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -91,6 +113,70 @@ def upload_file():
         flash('File type not allowed. Please upload a video file (mp4, avi, mov, mkv)', 'danger')
         return redirect(url_for('index'))
 
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename', ''))
+    if not filename or not allowed_file(filename):
+        return jsonify({'status': 'error', 'message': 'File type not allowed. Please upload a video file (mp4, avi, mov, mkv)'}), 400
+
+    try:
+        upload = upload_manager.create(filename, int(data.get('size', 0)))
+    except (UploadError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    return jsonify(dict(upload.to_dict(), status='success', chunk_url=url_for('upload_chunk', upload_id=upload.id)))
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'PUT'])
+def upload_chunk(upload_id):
+    upload = upload_manager.get(upload_id)
+    if upload is None:
+        return jsonify({'status': 'error', 'message': 'Unknown upload'}), 404
+
+    if request.method == 'PUT':
+        try:
+            offset = int(request.args.get('offset', -1))
+            upload_manager.write_chunk(upload, offset, request.stream, request.content_length)
+        except UploadOffsetError as e:
+            # Tell the client where to resume from
+            return jsonify(dict(upload.to_dict(), status='error', message=str(e))), 409
+        except (UploadError, ValueError) as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    return jsonify(dict(upload.to_dict(), status='success'))
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    upload = upload_manager.get(upload_id)
+    if upload is None:
+        return jsonify({'status': 'error', 'message': 'Unknown upload'}), 404
+
+    # Create a unique filename
+    unique_id = str(uuid.uuid4())
+    base_filename, extension = os.path.splitext(upload.filename)
+    unique_filename = f"{base_filename}_{unique_id}{extension}"
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+
+    try:
+        content_hash = upload_manager.finalize(upload, file_path)
+    except UploadError as e:
+        return jsonify(dict(upload.to_dict(), status='error', message=str(e))), 409
+
+    # The hash was computed while the chunks arrived, so processing does not re-read the file
+    remember_hash(file_path, content_hash)
+
+    # Store file information in session
+    session['uploaded_video'] = {
+        'filename': unique_filename,
+        'original_name': upload.filename,
+        'path': file_path,
+        'unique_id': unique_id,
+        'content_hash': content_hash,
+        'timestamp': time.time()
+    }
+
+    return jsonify({'status': 'success', 'redirect': url_for('process_video_view')})
+
 @app.route('/process')
 def process_video_view():
     if 'uploaded_video' not in session:
@@ -105,7 +191,75 @@ def process_video_view():
         logger.info("Created sample video entry for demo")
 
     video_info = session['uploaded_video']
-    return render_template('process.html', video=video_info)
+
+    # Let the page follow a job that is still in progress instead of offering a new one
+    job = active_job()
+    job_status_url = url_for('job_status', job_id=job.id) if job is not None else None
+    return render_template('process.html', video=video_info, job_status_url=job_status_url)
+
+def run_processing_job(job, video_path, unique_id, language):
+    """
+    Run the full processing pipeline for one video inside a worker thread.
+
+    The results are saved to the result store under the job id.
+
+    Returns:
+        dict: The result id and media key, stored on the job
+    """
+    # Define output paths
+    output_video_path = os.path.join(RESULTS_FOLDER, f"processed_{unique_id}.mp4")
+    output_audio_path = os.path.join(RESULTS_FOLDER, f"commentary_{unique_id}.mp3")
+    processed_video = os.path.join('static', 'results', f'processed_{unique_id}.mp4')
+
+    # Reuse the results of an identical video processed earlier
+    job.update('Checking for previous results...', 2)
+    cache_key = result_cache.key(hash_file(video_path), language, get_classifier().version)
+    cached = result_cache.get(cache_key)
+    metrics.RESULT_CACHE_REQUESTS.inc(result='miss' if cached is None else 'hit')
+    if cached is not None:
+        files = cached.pop('files')
+        link_or_copy(files['processed_video'], output_video_path)
+        link_or_copy(files['commentary_audio'], output_audio_path)
+        if 'merged_video' in files:
+            link_or_copy(files['merged_video'], os.path.join(RESULTS_FOLDER, f"final_{unique_id}.mp4"))
+        return store_job_result(job, dict(cached, processed_video=processed_video,
+                                          commentary_audio=output_audio_path, media_key=cache_key))
+
+    # Process the video to detect events (players, ball, shots, boundaries, wickets)
+    logger.debug(f"Starting to process video: {video_path}")
+
+    # Process the video to detect events
+    result = process_video(video_path, output_video_path, unique_id=unique_id,
+                           language=language, progress=job.update)
+
+    # The commentary audio is synthesized inside process_video; fall back to the sample if it failed
+    media_key = None
+    if result.commentary_audio is None:
+        logger.warning("Failed to generate commentary audio, using sample instead")
+        import shutil
+        sample_audio = os.path.join(SAMPLE_FOLDER, 'sample-commentary.mp3')
+        shutil.copy(sample_audio, output_audio_path)
+    else:
+        media_key = cache_key
+        result_cache.put(cache_key, {'events': result.events, 'commentary': result.commentary}, files={
+            'processed_video': result.processed_video,
+            'commentary_audio': result.commentary_audio,
+            'merged_video': result.merged_video
+        })
+
+    return store_job_result(job, {
+        'processed_video': processed_video,
+        'commentary_audio': output_audio_path,
+        'events': result.events,
+        'commentary': result.commentary,
+        'media_key': media_key
+    })
+
+def store_job_result(job, result):
+    """Save a job's results to the result store and return the small summary kept on the job"""
+    with app.app_context():
+        save_result(job.id, result)
+    return {'result_id': job.id, 'media_key': result.get('media_key')}
 
 @app.route('/start_processing', methods=['POST'])
 def start_processing():
@@ -116,54 +270,49 @@ def start_processing():
     video_path = video_info['path']
     unique_id = video_info['unique_id']
 
-    try:
-        # Get selected language
-        language = request.form.get('language', 'en')
-        logger.info(f"Selected language for commentary: {language}")
-
-        # Process the video to detect events (players, ball, shots, boundaries, wickets)
-        logger.debug(f"Starting to process video: {video_path}")
-
-        # Define output paths
-        output_video_path = os.path.join(app.config['RESULTS_FOLDER'], f"processed_{unique_id}.mp4")
-        output_audio_path = os.path.join(app.config['RESULTS_FOLDER'], f"commentary_{unique_id}.mp3")
-
-        # Process the video to detect events
-        events, processed_video_path, commentary = process_video(video_path, output_video_path, unique_id=unique_id, language=language)
-
-        # Convert commentary to speech
-        logger.info(f"Converting commentary to speech: {len(commentary)} characters")
-        from utils.text_to_speech import text_to_speech
-        success = text_to_speech(commentary, output_audio_path)
-
-        if not success:
-            logger.warning("Failed to generate commentary audio, using sample instead")
-            import shutil
-            sample_audio = os.path.join(app.config['SAMPLE_FOLDER'], 'sample-commentary.mp3')
-            shutil.copy(sample_audio, output_audio_path)
-
-        # Update session with results 
-        processed_video = os.path.join('static', 'results', f'processed_{unique_id}.mp4')
-        session['processing_results'] = {
-            'processed_video': processed_video,
-            'commentary_audio': output_audio_path,
-            'events': events,
-            'commentary': commentary
-        }
-
-        return jsonify({
-            'status': 'success', 
-            'message': 'Video processing completed', 
-            'redirect': url_for('results')
-        })
-
-    except Exception as e:
-        logger.error(f"Error during video processing: {str(e)}")
-        return jsonify({'status': 'error', 'message': f'Error processing video: {str(e)}'})
+    # Get selected language
+    language = request.form.get('language', 'en')
+    logger.info(f"Selected language for commentary: {language}")
+
+    # Hand the work to the job queue and return straight away
+    job = job_queue.submit(run_processing_job, video_path, unique_id, language)
+    session['job_id'] = job.id
+
+    return jsonify({
+        'status': 'success',
+        'message': 'Video processing started',
+        'job_id': job.id,
+        'status_url': url_for('job_status', job_id=job.id)
+    })
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+
+    job_info = job.to_dict()
+    if job_info['status'] == 'done':
+        job_info['redirect'] = url_for('results')
+    return jsonify({'status': 'success', 'job': job_info})
+
+def active_job():
+    """The session's processing job if it is still queued or running, else None"""
+    job_id = session.get('job_id')
+    job = job_queue.get(job_id) if job_id else None
+    if job is not None and job.status in ('queued', 'running'):
+        return job
+    return None
 
 @app.route('/results')
 def results():
-    if 'processing_results' not in session:
+    results_info = load_result(session.get('job_id'))
+
+    if results_info is None:
+        # Results of a job in progress do not exist yet; keep the session pointing at it
+        if active_job() is not None:
+            return redirect(url_for('process_video_view'))
+
         # For demo purposes, create sample results
         if 'uploaded_video' not in session:
             # Also create a sample video entry if needed
@@ -184,20 +333,26 @@ def results():
         sample_commentary = generate_commentary(sample_events)
 
         # Create sample results
-        session['processing_results'] = {
+        results_info = {
             'processed_video': os.path.join('static', 'samples', 'sample-cricket.mp4'),
             'commentary_audio': os.path.join('static', 'samples', 'sample-commentary.mp3'),
             'events': sample_events,
             'commentary': sample_commentary
         }
+        session['job_id'] = f"sample-{uuid.uuid4().hex}"
+        save_result(session['job_id'], results_info)
         logger.info("Created sample results for demo")
 
     video_info = session['uploaded_video']
-    results_info = session['processing_results']
+
+    # Play the faststart video with the commentary muxed in when the merge worked
+    media_key = results_info.get('media_key')
+    merged_video = bool(media_key) and (result_cache.root / media_key / 'merged_video.mp4').is_file()
 
     return render_template('results.html', 
                           video=video_info, 
-                          results=results_info)
+                          results=results_info,
+                          merged_video=merged_video)
 
 @app.route('/youtube_link', methods=['POST'])
 def youtube_link():
@@ -294,15 +449,47 @@ def youtube_link():
         flash(f"Error downloading video: {str(e)}", 'danger')
         return redirect(url_for('index'))
 
+# Cached outputs never change under a given key, so clients may keep them for a year
+MEDIA_MAX_AGE = 365 * 24 * 3600
+
+# Files of a cache entry that may be served; result.json and anything else stay private
+MEDIA_FILES = ('processed_video', 'commentary_audio', 'merged_video')
+
+@app.route('/media/<key>/<name>')
+def media(key, name):
+    """
+    Serve a content-addressed result file.
+
+    Byte-range requests are answered with 206 partial content, so seeking
+    only fetches the bytes needed, and the ETag is derived from the
+    content-hash key so repeat views are answered from the browser cache.
+    """
+    if os.path.splitext(name)[0] not in MEDIA_FILES:
+        abort(404)
+    path = safe_join(str(result_cache.root), key, name)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    response = send_file(path, conditional=True, etag=f"{key}-{name}", max_age=MEDIA_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Pipeline counters and stage latency histograms in Prometheus text format"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/events')
 def get_events():
-    if 'processing_results' not in session:
+    results_info = load_result(session.get('job_id'))
+    if results_info is None:
         # For demo purposes, generate sample events
         from utils.video_processor import generate_simulated_events
         sample_events = generate_simulated_events()
         return jsonify({'status': 'success', 'events': sample_events})
 
-    events = session['processing_results'].get('events', [])
+    events = results_info.get('events', [])
     return jsonify({'status': 'success', 'events': events})
 
 if __name__ == '__main__':
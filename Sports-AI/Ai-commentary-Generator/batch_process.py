@@ -0,0 +1,197 @@
+"""
+Generate commentary for a directory or manifest of clips offline.
+
+Clips are processed across a pool of worker processes. Every finished clip
+is appended to an events JSONL file in the output directory, which doubles
+as the record of what has been done: clips whose content, language and
+model version already appear there are skipped, so an interrupted run can
+simply be started again.
+
+Usage:
+    python batch_process.py /archive/clips --workers 8
+    python batch_process.py manifest.txt --output-dir out --language hi --tts silent
+
+A manifest lists one clip per line, either as a path (relative to the
+manifest) or as a JSON object with "path" and optionally "language".
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv'}
+
+def find_clips(source, language):
+    """
+    List the clips to process.
+
+    Args:
+        source (str): Directory to scan recursively, or a manifest file
+        language (str): Commentary language for clips that do not set one
+
+    Returns:
+        list: (path, language) pairs
+    """
+    if os.path.isdir(source):
+        clips = []
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS:
+                    clips.append((os.path.join(root, name), language))
+        return sorted(clips)
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    clips = []
+    with open(source, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                entry = json.loads(line)
+                path, clip_language = entry['path'], entry.get('language', language)
+            else:
+                path, clip_language = line, language
+            clips.append((os.path.join(base_dir, path), clip_language))
+    return clips
+
+def load_done_keys(events_path):
+    """Result keys of the clips already recorded in the events file"""
+    done = set()
+    if not os.path.exists(events_path):
+        return done
+    with open(events_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by an interrupted run
+            if record.get('status') == 'done':
+                done.add(record['key'])
+    return done
+
+# Per-process state, set up once by _init_worker
+_worker = {}
+
+def _init_worker(done_keys, tts, sample_rate, frames_per_second):
+    from utils.shot_classification import get_classifier
+    from utils import text_to_speech
+
+    classifier = get_classifier()
+    # Each process already has a core of its own
+    classifier.model.n_jobs = 1
+
+    _worker.update(
+        done_keys=done_keys,
+        model_version=classifier.version,
+        tts_backend=text_to_speech.SilentBackend() if tts == 'silent' else None,
+        sample_rate=sample_rate,
+        frames_per_second=frames_per_second
+    )
+
+def process_clip(path, language, output_dir):
+    """
+    Process one clip inside a worker process.
+
+    Returns:
+        dict: Record for the events file; status is 'done', 'skipped' or 'failed'
+    """
+    from utils.result_cache import ResultCache, hash_file
+    from utils.video_processor import process_video
+
+    started = time.perf_counter()
+    record = {'clip': path, 'language': language, 'model_version': _worker['model_version']}
+    try:
+        content_hash = hash_file(path)
+        key = ResultCache.key(content_hash, language, _worker['model_version'])
+        record.update(content_hash=content_hash, key=key)
+        if key in _worker['done_keys']:
+            record['status'] = 'skipped'
+            return record
+        hash_time = time.perf_counter() - started
+
+        unique_id = f"{os.path.splitext(os.path.basename(path))[0]}_{key[:12]}"
+        clip_dir = os.path.join(output_dir, 'clips', unique_id)
+        result = process_video(path, os.path.join(clip_dir, f'processed_{unique_id}.mp4'),
+                               sample_rate=_worker['sample_rate'], unique_id=unique_id, language=language,
+                               frames_per_second=_worker['frames_per_second'], export_frames=False,
+                               tts_backend=_worker['tts_backend'], link_video=False)
+
+        record.update(result.to_dict(), status='done')
+        record['timings'] = dict(result.timings, hash=hash_time)
+    except Exception as e:
+        logger.error(f"Failed to process {path}: {str(e)}")
+        record.update(status='failed', error=str(e))
+
+    record.setdefault('timings', {})['wall'] = time.perf_counter() - started
+    return record
+
+def print_summary(records, elapsed, workers):
+    """Print throughput and per-stage timing for the processed clips"""
+    done = [r for r in records if r['status'] == 'done']
+    skipped = sum(1 for r in records if r['status'] == 'skipped')
+    failed = sum(1 for r in records if r['status'] == 'failed')
+    frames = sum(r.get('frame_count', 0) for r in done)
+
+    print(f"\n{len(done)} processed, {skipped} skipped, {failed} failed in {elapsed:.1f}s with {workers} workers")
+    if not done or elapsed <= 0:
+        return
+    print(f"Throughput: {len(done) / elapsed:.2f} clips/s, {frames / elapsed:.1f} frames/s")
+
+    stages = sorted({stage for r in done for stage in r['timings']})
+    print(f"{'stage':<16}{'total s':>10}{'mean s':>10}")
+    for stage in stages:
+        times = [r['timings'][stage] for r in done if stage in r['timings']]
+        print(f"{stage:<16}{sum(times):>10.2f}{sum(times) / len(times):>10.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate commentary for a batch of cricket clips")
+    parser.add_argument('source', help="Directory of clips or manifest file")
+    parser.add_argument('--output-dir', default='batch_output', help="Where outputs and events.jsonl are written")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument('--language', default='en', choices=['en', 'hi', 'ta'], help="Default commentary language")
+    parser.add_argument('--sample-rate', type=int, default=3, help="Classify every nth frame")
+    parser.add_argument('--fps', type=float, default=None, help="Sample this many frames per second instead")
+    parser.add_argument('--tts', default='gtts', choices=['gtts', 'silent'], help="Speech backend")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    # Workers run one clip each, so keep every library to a single thread per process
+    os.environ.setdefault('FEATURE_WORKERS', '1')
+    os.environ.setdefault('OMP_NUM_THREADS', '1')
+
+    clips = find_clips(args.source, args.language)
+    os.makedirs(args.output_dir, exist_ok=True)
+    events_path = os.path.join(args.output_dir, 'events.jsonl')
+    done_keys = load_done_keys(events_path)
+    print(f"{len(clips)} clips found, {len(done_keys)} already in {events_path}")
+
+    records = []
+    started = time.perf_counter()
+    # Spawned workers do not inherit the parent's threads or locks
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=_init_worker,
+                             initargs=(done_keys, args.tts, args.sample_rate, args.fps)) as pool, \
+            open(events_path, 'a', encoding='utf-8') as events_file:
+        futures = [pool.submit(process_clip, path, language, args.output_dir) for path, language in clips]
+        for count, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            records.append(record)
+            if record['status'] != 'skipped':
+                events_file.write(json.dumps(record) + '\n')
+                events_file.flush()
+            print(f"[{count}/{len(clips)}] {record['status']}: {record['clip']}", file=sys.stderr)
+
+    print_summary(records, time.perf_counter() - started, args.workers)
+    return 1 if any(r['status'] == 'failed' for r in records) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
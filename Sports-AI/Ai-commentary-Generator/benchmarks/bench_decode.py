@@ -0,0 +1,63 @@
+"""
+Decode throughput benchmark for the frame sampling modes in video_processor.
+
+Compares decoding every frame and keeping every nth one ('read'), skipping
+frames with grab() ('grab') and timestamp-based sampling with seeks
+('seek') on the same clip.
+
+Usage (from Ai-commentary-Generator/):
+    python benchmarks/bench_decode.py [--video PATH] [--sample-rate 3] [--fps 2 10]
+"""
+import os
+import sys
+import time
+import argparse
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.video_processor import decode_frames
+
+SAMPLE_VIDEO = os.path.join('static', 'samples', 'sample-cricket.mp4')
+
+def run(video, repeat, **kwargs):
+    """Best-of-`repeat` wall time and number of frames kept for one decode mode"""
+    best = float('inf')
+    kept = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        kept = sum(1 for _ in decode_frames(video, **kwargs))
+        best = min(best, time.perf_counter() - start)
+    return best, kept
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--video', default=SAMPLE_VIDEO, help='Video to decode')
+    parser.add_argument('--sample-rate', type=int, default=3, help='Keep every nth frame in read/grab modes')
+    parser.add_argument('--fps', type=float, nargs='+', default=[2.0, 10.0], help='Frames per second for seek mode')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions, best time is reported')
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.video)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    duration = total_frames / fps if fps > 0 else 0
+    print(f"{args.video}: {total_frames} frames at {width}x{height}, {fps:.1f} fps ({duration:.1f}s)")
+
+    cases = [
+        (f'read every {args.sample_rate}', dict(mode='read', sample_rate=args.sample_rate)),
+        (f'grab every {args.sample_rate}', dict(mode='grab', sample_rate=args.sample_rate)),
+    ] + [(f'seek {rate:g}/s', dict(mode='seek', frames_per_second=rate)) for rate in args.fps]
+
+    baseline = None
+    for name, kwargs in cases:
+        elapsed, kept = run(args.video, args.repeat, **kwargs)
+        baseline = baseline or elapsed
+        print(f"{name:<16} {kept:5d} kept  {elapsed * 1000:8.1f} ms  "
+              f"{total_frames / elapsed:8.1f} video frames/s  {baseline / elapsed:5.2f}x")
+
+if __name__ == '__main__':
+    main()
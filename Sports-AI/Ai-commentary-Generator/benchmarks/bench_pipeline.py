@@ -0,0 +1,303 @@
+"""
+End-to-end and per-stage benchmark of the video analysis pipeline.
+
+Synthetic clips (a pitch with moving players and a ball) are generated with
+OpenCV at several resolutions and durations, and the bundled sample clip is
+added when present. For every clip the benchmark times process_video end to
+end and each stage on its own: decode, ShotClassifier.extract_features,
+classify_frame_sequence, detect_objects, the tracker-driven ROI detector
+(with the fraction of frames that needed a whole-frame search), batched
+ONNX detection when a detector model is installed, BallTracker.update and
+text to speech through the offline SilentBackend.
+
+Results are written to a JSON file. Given a baseline file from an earlier
+run, every measurement is compared against it and the run fails if any
+stage got slower than the tolerance allows.
+
+Usage (from Ai-commentary-Generator/):
+    python benchmarks/bench_pipeline.py --output bench.json
+    python benchmarks/bench_pipeline.py --baseline bench.json --tolerance 0.15
+    python benchmarks/bench_pipeline.py --quick --update-baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import text_to_speech
+from utils.video_processor import decode_frames, process_video
+from utils.shot_classification import ShotClassifier, CRICKET_SHOTS
+from utils.object_detection import detect_objects, get_detector, DETECTOR_BATCH_SIZE, RegionDetector
+from utils.event_detection import BallTracker
+from utils.commentary_generator import generate_commentary
+from utils.video_processor import generate_simulated_events
+
+SAMPLE_VIDEO = os.path.join('static', 'samples', 'sample-cricket.mp4')
+
+# (name, width, height, seconds)
+SYNTHETIC_CLIPS = [
+    ('360p-4s', 640, 360, 4),
+    ('720p-4s', 1280, 720, 4),
+    ('1080p-2s', 1920, 1080, 2),
+]
+QUICK_CLIPS = [('360p-2s', 640, 360, 2)]
+SYNTHETIC_FPS = 25
+
+def make_synthetic_clip(path, width, height, seconds, fps=SYNTHETIC_FPS, seed=0):
+    """
+    Write a clip of a green field with stumps, two moving players and a
+    ball on a parabolic path, deterministic for a given seed.
+    """
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open a video writer for {path}")
+
+    background = np.zeros((height, width, 3), np.uint8)
+    background[:] = (40, 140, 40)
+    noise = rng.integers(0, 20, (height, width, 1), dtype=np.uint8)
+    background = cv2.add(background, np.repeat(noise, 3, axis=2))
+    pitch = (width // 2 - width // 16, height // 5, width // 2 + width // 16, height * 4 // 5)
+    cv2.rectangle(background, pitch[:2], pitch[2:], (120, 170, 190), -1)
+    for dx in (-8, 0, 8):
+        x = width // 2 + dx * width // 640
+        cv2.line(background, (x, pitch[3] - height // 10), (x, pitch[3]), (230, 230, 230), max(1, width // 640))
+
+    frames = int(seconds * fps)
+    radius = max(6, width // 200)
+    for i in range(frames):
+        frame = background.copy()
+        t = i / max(1, frames - 1)
+        for k, colour in enumerate(((250, 250, 250), (30, 30, 200))):
+            px = int(width * (0.3 + 0.4 * k) + np.sin(t * 6 + k) * width * 0.05)
+            py = int(height * 0.55)
+            cv2.rectangle(frame, (px, py), (px + width // 40, py + height // 6), colour, -1)
+        bx = int(width * (0.5 + 0.4 * np.sin(t * np.pi)))
+        by = int(height * (0.8 - 0.6 * t + 0.5 * t * t))
+        cv2.circle(frame, (bx, by), radius, (235, 235, 235), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+def best_of(repeat, fn):
+    """Best wall time of `repeat` calls to fn, and its last return value"""
+    best = float('inf')
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+def train_benchmark_classifier(seed=0):
+    """Forest trained on solid-colour frames, so inference runs the real model path"""
+    rng = np.random.default_rng(seed)
+    classifier = ShotClassifier(load_templates=False)
+    frames = {
+        shot: [np.full((96, 96, 3), rng.integers(0, 255, 3), np.uint8) for _ in range(8)]
+        for shot in CRICKET_SHOTS
+    }
+    classifier.train(frames)
+    return classifier
+
+def record(results, clip, stage, seconds, items, unit='frame'):
+    results[f"{clip}/{stage}"] = {
+        'seconds': seconds,
+        'items': items,
+        'unit': unit,
+        'per_item_ms': seconds * 1000 / items if items else None,
+        'items_per_second': items / seconds if seconds > 0 else None
+    }
+
+def bench_clip(results, name, path, classifier, repeat, max_frames, workdir):
+    cap = cv2.VideoCapture(path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    seconds, decoded = best_of(repeat, lambda: sum(1 for _ in decode_frames(path, sample_rate=1)))
+    record(results, name, 'decode', seconds, decoded)
+
+    frames = [frame for _, frame in decode_frames(path, sample_rate=3)][:max_frames]
+
+    seconds, _ = best_of(repeat, lambda: [classifier.extract_features(frame) for frame in frames])
+    record(results, name, 'extract_features', seconds, len(frames))
+
+    seconds, _ = best_of(repeat, lambda: classifier.classify_frame_sequence(frames))
+    record(results, name, 'classify_frame_sequence', seconds, len(frames))
+
+    seconds, _ = best_of(repeat, lambda: [detect_objects(frame) for frame in frames])
+    record(results, name, 'detect_objects', seconds, len(frames))
+
+    # Ball search around the tracker's prediction, whole frame only when lost
+    def detect_tracked():
+        region_detector = RegionDetector()
+        tracker = BallTracker()
+        for frame_num, frame in enumerate(frames):
+            balls = [o for o in region_detector.detect(frame, tracker.predict(frame_num)) if o['class'] == 'ball']
+            position = None
+            if balls:
+                x1, y1, x2, y2 = balls[0]['bbox']
+                position = ((x1 + x2) / 2, (y1 + y2) / 2)
+            tracker.update(position, frame_num)
+        return region_detector
+    seconds, region_detector = best_of(repeat, detect_tracked)
+    record(results, name, 'detect_objects_roi', seconds, len(frames))
+    results[f"{name}/detect_objects_roi"]['full_search_fraction'] = region_detector.full_search_fraction()
+
+    detector = get_detector()
+    if detector is not None:
+        def detect_batched():
+            for start in range(0, len(frames), DETECTOR_BATCH_SIZE):
+                detector.detect_batch(frames[start:start + DETECTOR_BATCH_SIZE])
+        seconds, _ = best_of(repeat, detect_batched)
+        record(results, name, 'detect_batch', seconds, len(frames))
+
+    # A ball crossing the frame once per 100 updates
+    height, width = frames[0].shape[:2]
+    updates = 2000
+    t = np.arange(updates) % 100 / 100
+    trajectory = [(float(width * (0.1 + 0.8 * x)), float(height * (0.8 - 0.6 * x + 0.5 * x * x))) for x in t]
+
+    def track():
+        tracker = BallTracker()
+        for frame_num, position in enumerate(trajectory):
+            tracker.update(position, frame_num)
+    seconds, _ = best_of(repeat, track)
+    record(results, name, 'BallTracker.update', seconds, updates, unit='update')
+
+    output_dir = os.path.join(workdir, name)
+    seconds, result = best_of(repeat, lambda: process_video(
+        path, os.path.join(output_dir, f'processed_{name}.mp4'), unique_id=name,
+        export_frames=False, tts_backend=text_to_speech.SilentBackend()))
+    record(results, name, 'process_video', seconds, max(total_frames, result.frame_count))
+
+def check_mp3_frames():
+    """Fail fast if a leading Info header frame would be copied into joined commentary"""
+    frame = text_to_speech.SilentBackend.FRAME
+    side_info_end = 4 + 17  # MPEG-1 mono header and side info
+    info_frame = frame[:side_info_end] + b'Info' + frame[side_info_end + 4:]
+    for leading in (b'', info_frame):
+        count = sum(1 for _ in text_to_speech.iter_mp3_frames(leading + frame * 3))
+        if count != 3:
+            raise RuntimeError(f"iter_mp3_frames yielded {count} frames for 3 audio frames"
+                               f"{' after an Info frame' if leading else ''}")
+
+def bench_tts(results, repeat, workdir):
+    check_mp3_frames()
+    # Commentary templates are picked at random, so fix the seed for a stable text
+    random.seed(0)
+    events = generate_simulated_events()
+    backend = text_to_speech.SilentBackend()
+    for language in ('en', 'hi', 'ta'):
+        random.seed(0)
+        commentary = generate_commentary(events, language=language)
+        output_path = os.path.join(workdir, f'commentary_{language}.mp3')
+
+        def cold():
+            cache = text_to_speech.PhraseAudioCache(os.path.join(workdir, f'tts-cold-{time.perf_counter_ns()}'))
+            return text_to_speech.text_to_speech(commentary, output_path, language, backend, cache)
+        seconds, _ = best_of(repeat, cold)
+        record(results, 'tts', f'{language}-cold', seconds, len(commentary), unit='char')
+
+        warm_cache = text_to_speech.PhraseAudioCache(os.path.join(workdir, 'tts-warm'))
+        text_to_speech.text_to_speech(commentary, output_path, language, backend, warm_cache)
+        seconds, _ = best_of(repeat, lambda: text_to_speech.text_to_speech(
+            commentary, output_path, language, backend, warm_cache))
+        record(results, 'tts', f'{language}-warm', seconds, len(commentary), unit='char')
+
+def compare(results, baseline, tolerance):
+    """
+    Print each measurement against the baseline.
+
+    Returns:
+        list: Keys that are slower than the baseline by more than the tolerance
+    """
+    regressions = []
+    print(f"\n{'benchmark':<40}{'baseline ms':>14}{'current ms':>14}{'ratio':>8}")
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None or not previous['seconds']:
+            print(f"{key:<40}{'-':>14}{current['seconds'] * 1000:>14.2f}{'new':>8}")
+            continue
+        ratio = current['seconds'] / previous['seconds']
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print(f"{key:<40}{previous['seconds'] * 1000:>14.2f}{current['seconds'] * 1000:>14.2f}{ratio:>8.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', default='bench_results.json', help='Where to write the results')
+    parser.add_argument('--baseline', help='Earlier results to compare against')
+    parser.add_argument('--update-baseline', metavar='PATH', help='Also save the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed slowdown as a fraction of the baseline')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions, best time is reported')
+    parser.add_argument('--max-frames', type=int, default=64, help='Frames used by the per-frame stages')
+    parser.add_argument('--quick', action='store_true', help='One small synthetic clip, for smoke runs')
+    parser.add_argument('--no-sample', action='store_true', help='Skip the bundled sample clip')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-pipeline-')
+    # Keep the shared phrase cache out of the measurements
+    text_to_speech.phrase_cache = text_to_speech.PhraseAudioCache(os.path.join(workdir, 'tts-shared'))
+    try:
+        clips = []
+        for index, (name, width, height, seconds) in enumerate(QUICK_CLIPS if args.quick else SYNTHETIC_CLIPS):
+            clips.append((name, make_synthetic_clip(os.path.join(workdir, f'{name}.mp4'), width, height, seconds, seed=index)))
+        if not args.no_sample and os.path.exists(SAMPLE_VIDEO):
+            clips.append(('sample', SAMPLE_VIDEO))
+
+        classifier = train_benchmark_classifier()
+        results = {}
+        for name, path in clips:
+            print(f"Benchmarking {name}...", file=sys.stderr)
+            bench_clip(results, name, path, classifier, args.repeat, args.max_frames, workdir)
+        bench_tts(results, args.repeat, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'repeat': args.repeat,
+            'quick': args.quick
+        },
+        'results': results
+    }
+    for path in filter(None, (args.output, args.update_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmarks regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%}")
+    else:
+        print(f"\n{'benchmark':<40}{'ms':>12}{'per item ms':>14}{'items/s':>12}")
+        for key, value in results.items():
+            print(f"{key:<40}{value['seconds'] * 1000:>12.2f}{value['per_item_ms'] or 0:>14.3f}{value['items_per_second'] or 0:>12.1f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
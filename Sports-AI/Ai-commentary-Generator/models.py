@@ -1,2 +1,73 @@
-# Currently not using database models for this application
-# This file is a placeholder for potential future expansion
+import os
+import time
+import logging
+from flask_sqlalchemy import SQLAlchemy
+
+logger = logging.getLogger(__name__)
+
+db = SQLAlchemy()
+
+# Stored results older than this are pruned when new ones are saved
+RESULT_RETENTION_SECONDS = int(os.environ.get("RESULT_RETENTION_DAYS", 30)) * 24 * 3600
+
+class ProcessingResult(db.Model):
+    """
+    Results of one processing job, kept server-side.
+
+    The browser session only carries the job id; events and commentary,
+    which easily outgrow the 4 KB cookie limit, live here.
+    """
+
+    __tablename__ = 'processing_results'
+
+    job_id = db.Column(db.String(64), primary_key=True)
+    processed_video = db.Column(db.String(512), nullable=False)
+    commentary_audio = db.Column(db.String(512), nullable=False)
+    events = db.Column(db.JSON, nullable=False, default=list)
+    commentary = db.Column(db.Text, nullable=False, default='')
+    media_key = db.Column(db.String(64))
+    created = db.Column(db.Float, nullable=False, default=time.time, index=True)
+
+    def to_dict(self):
+        return {
+            'processed_video': self.processed_video,
+            'commentary_audio': self.commentary_audio,
+            'events': self.events,
+            'commentary': self.commentary,
+            'media_key': self.media_key
+        }
+
+def save_result(job_id, result):
+    """
+    Store the results of a job, replacing any earlier ones under the same id.
+
+    Args:
+        job_id (str): Job id the results belong to
+        result (dict): processed_video, commentary_audio, events, commentary
+                       and optionally media_key
+    """
+    db.session.merge(ProcessingResult(
+        job_id=job_id,
+        processed_video=result['processed_video'],
+        commentary_audio=result['commentary_audio'],
+        events=result.get('events', []),
+        commentary=result.get('commentary', ''),
+        media_key=result.get('media_key'),
+        created=time.time()
+    ))
+    pruned = ProcessingResult.query.filter(ProcessingResult.created < time.time() - RESULT_RETENTION_SECONDS).delete()
+    db.session.commit()
+    if pruned:
+        logger.info(f"Pruned {pruned} expired processing results")
+
+def load_result(job_id):
+    """
+    Look up the results of a job.
+
+    Returns:
+        dict: Stored results, or None if there are none for this id
+    """
+    if not job_id:
+        return None
+    result = db.session.get(ProcessingResult, job_id)
+    return result.to_dict() if result is not None else None
@@ -42,9 +42,21 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Upload in resumable chunks, falling back to a plain form post
+    if (uploadForm && videoUpload && window.fetch) {
+        uploadForm.addEventListener('submit', handleChunkedUpload);
+    }
+
     // Initialize processing functionality
     if (startProcessingBtn) {
         startProcessingBtn.addEventListener('click', startProcessing);
+
+        // A job for this video is already running: follow it instead of starting another
+        if (startProcessingBtn.dataset.jobStatusUrl) {
+            showProcessing();
+            updateProgress(5, 'Resuming video processing...');
+            pollJobStatus(startProcessingBtn.dataset.jobStatusUrl);
+        }
     }
 
     // Initialize YouTube link handling
@@ -122,8 +134,80 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Functions for chunked upload
+    const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+    const UPLOAD_MAX_RETRIES = 5;
+
+    function handleChunkedUpload(e) {
+        const file = videoUpload.files[0];
+        if (!file) return;
+        e.preventDefault();
+
+        if (uploadButton) {
+            uploadButton.disabled = true;
+            uploadButton.innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> Uploading...';
+        }
+
+        uploadInChunks(file)
+            .then(data => {
+                window.location.href = data.redirect;
+            })
+            .catch(error => {
+                console.error('Chunked upload failed, falling back to form upload:', error);
+                uploadForm.removeEventListener('submit', handleChunkedUpload);
+                uploadForm.submit();
+            });
+    }
+
+    async function uploadInChunks(file) {
+        const init = await fetch('/api/uploads', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({filename: file.name, size: file.size})
+        }).then(checkResponse);
+
+        let offset = init.offset;
+        let retries = 0;
+        while (offset < file.size) {
+            const chunk = file.slice(offset, offset + UPLOAD_CHUNK_SIZE);
+            try {
+                const response = await fetch(`${init.chunk_url}?offset=${offset}`, {
+                    method: 'PUT',
+                    headers: {'Content-Type': 'application/octet-stream'},
+                    body: chunk
+                });
+                const data = await response.json();
+                if (!response.ok && response.status !== 409) {
+                    throw new Error(data.message || 'Chunk upload failed');
+                }
+                // On 409 the server reports where to resume from
+                offset = data.offset;
+                retries = 0;
+            } catch (error) {
+                if (++retries > UPLOAD_MAX_RETRIES) throw error;
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                offset = (await fetch(init.chunk_url).then(checkResponse)).offset;
+            }
+
+            if (uploadButton) {
+                uploadButton.textContent = `Uploading... ${Math.floor(offset / file.size * 100)}%`;
+            }
+        }
+
+        return fetch(`${init.chunk_url}/finalize`, {method: 'POST'}).then(checkResponse);
+    }
+
+    function checkResponse(response) {
+        return response.json().then(data => {
+            if (!response.ok) {
+                throw new Error(data.message || `Request failed with status ${response.status}`);
+            }
+            return data;
+        });
+    }
+
     // Functions for video processing
-    function startProcessing() {
+    function showProcessing() {
         if (startProcessingBtn) {
             startProcessingBtn.disabled = true;
             startProcessingBtn.innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> Processing...';
@@ -132,7 +216,10 @@ document.addEventListener('DOMContentLoaded', function() {
         if (processingStatus) {
             processingStatus.style.display = 'block';
         }
+    }
 
+    function startProcessing() {
+        showProcessing();
         updateProgress(5, 'Initializing video processing...');
 
         // Send request to start processing
@@ -147,7 +234,7 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(response => response.json())
         .then(data => {
             if (data.status === 'success') {
-                simulateProcessingProgress();
+                pollJobStatus(data.status_url);
             } else {
                 showError(data.message || 'An error occurred during processing');
             }
@@ -158,36 +245,33 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
-    function simulateProcessingProgress() {
-        let progress = 10;
-        const steps = [
-            { progress: 20, message: 'Analyzing video frames...' },
-            { progress: 40, message: 'Detecting players and ball...' },
-            { progress: 60, message: 'Classifying cricket shots...' },
-            { progress: 75, message: 'Identifying key events...' },
-            { progress: 85, message: 'Generating commentary...' },
-            { progress: 95, message: 'Creating final output...' },
-            { progress: 100, message: 'Processing complete!' }
-        ];
-
-        let currentStep = 0;
-        const interval = setInterval(() => {
-            if (currentStep < steps.length) {
-                const step = steps[currentStep];
-                updateProgress(step.progress, step.message);
-                currentStep++;
-
-                if (currentStep === steps.length) {
-                    // Last step - redirect to results page
-                    clearInterval(interval);
-                    setTimeout(() => {
-                        window.location.href = '/results';
-                    }, 1000);
-                }
+    function pollJobStatus(statusUrl) {
+        fetch(statusUrl)
+        .then(response => response.json())
+        .then(data => {
+            if (data.status !== 'success') {
+                showError(data.message || 'Lost track of the processing job');
+                return;
+            }
+
+            const job = data.job;
+            updateProgress(job.percent, job.stage);
+
+            if (job.status === 'done') {
+                // Processing finished - redirect to results page
+                setTimeout(() => {
+                    window.location.href = job.redirect || '/results';
+                }, 1000);
+            } else if (job.status === 'failed') {
+                showError(job.error ? `Error processing video: ${job.error}` : 'An error occurred during processing');
             } else {
-                clearInterval(interval);
+                setTimeout(() => pollJobStatus(statusUrl), 1000);
             }
-        }, 3000); // Adjust timing for more realistic simulation
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            showError('Network error. Please try again.');
+        });
     }
 
     function updateProgress(percent, message) {
@@ -1,6 +1,6 @@
 
 from utils.youtube_processor import download_youtube_video  
-from utils.shot_classification import ShotClassifier
+from utils.shot_classification import ShotClassifier, MODEL_PATH
 import logging
 import os
 
@@ -86,9 +86,10 @@ def train_classifier():
     # Prepare training data and train classifier
     if video_paths:
         training_data = classifier.prepare_training_data(video_paths)
-        classifier.train(training_data)
-        logging.info("Classifier training completed successfully")
-        logging.info(f"Trained on {len(video_paths)} shot types: {list(video_paths.keys())}")
+        if classifier.train(training_data):
+            classifier.save(MODEL_PATH)
+            logging.info("Classifier training completed successfully")
+            logging.info(f"Trained on {len(video_paths)} shot types: {list(video_paths.keys())}")
     else:
         logging.error("No training videos downloaded successfully")
 
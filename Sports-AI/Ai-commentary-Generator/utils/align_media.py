@@ -1,19 +1,24 @@
 import os
 import logging
 import ffmpeg
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
 def align_media(video_path, audio_path, output_path):
     """
     Align video with commentary audio and merge them.
+
+    The video stream is copied as-is in a single pass and the MP4 index is
+    moved to the front of the file (+faststart), so browsers can start
+    playback before the whole file has downloaded.
     """
     try:
-        # Input video
-        video = ffmpeg.input(video_path)
+        # Input video (only its video stream, any original audio is replaced)
+        video = ffmpeg.input(video_path).video
 
         # Input audio 
-        audio = ffmpeg.input(audio_path)
+        audio = ffmpeg.input(audio_path).audio
 
         # Merge video with new audio
         stream = ffmpeg.output(
@@ -24,13 +29,15 @@ def align_media(video_path, audio_path, output_path):
             acodec='aac',        # Use AAC for audio
             strict='experimental',
             shortest=None,       # End when shortest input ends
-            async=1,            # Audio sync method
             vsync=1,            # Video sync method
-            avoid_negative_ts='make_zero'
+            avoid_negative_ts='make_zero',
+            movflags='+faststart',  # Put the moov atom first for progressive playback
+            **{'async': 1}      # Audio sync method ('async' is a Python keyword)
         )
 
         # Run the ffmpeg command
-        ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
+        with metrics.timer('merge'):
+            ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
         return True
 
     except ffmpeg.Error as e:
@@ -1,7 +1,9 @@
 import numpy as np
 import logging
+import threading
 import cv2
-from collections import deque
+from contextlib import contextmanager
+from utils.object_detection import RegionDetector
 
 logger = logging.getLogger(__name__)
 
@@ -21,62 +23,220 @@ FIELD_REGIONS = {
     }
 }
 
+# Track management for the ball tracker
+TRACK_CONFIRM_HITS = 3  # Detections before a new track is trusted
+TRACK_MAX_COAST = {'tentative': 3, 'confirmed': 15}  # Frames without a detection before a track is dropped
+GATE_THRESHOLD = 13.8  # Squared Mahalanobis distance, chi-square 2 dof at 99.9%
+
+class KalmanBallFilter:
+    """
+    Constant-acceleration Kalman filter over the image-plane ball position.
+
+    The state is (x, y, vx, vy, ax, ay) in pixels and frames; process noise
+    is modelled as white jerk. Steps of any number of frames are supported,
+    so the filter can run between sparse detections.
+    """
+
+    H = np.array([[1, 0, 0, 0, 0, 0], [0, 1, 0, 0, 0, 0]], dtype=np.float64)
+
+    def __init__(self, position, measurement_std=2.0, jerk_std=0.5, velocity_std=30.0, acceleration_std=5.0):
+        self.x = np.array([position[0], position[1], 0, 0, 0, 0], dtype=np.float64)
+        self.P = np.diag([measurement_std ** 2] * 2 + [velocity_std ** 2] * 2 + [acceleration_std ** 2] * 2)
+        self.R = np.eye(2) * measurement_std ** 2
+        self.jerk_var = jerk_std ** 2
+        self._models = {}
+
+    def _model(self, dt):
+        """Transition matrix and process noise for a step of dt frames"""
+        model = self._models.get(dt)
+        if model is None:
+            F = np.eye(6)
+            F[0, 2] = F[1, 3] = F[2, 4] = F[3, 5] = dt
+            F[0, 4] = F[1, 5] = dt * dt / 2
+            g = np.array([dt ** 3 / 6, dt ** 2 / 2, dt])
+            Q = np.zeros((6, 6))
+            for axis in (0, 1):
+                index = np.array([axis, axis + 2, axis + 4])
+                Q[np.ix_(index, index)] = np.outer(g, g) * self.jerk_var
+            model = self._models[dt] = (F, Q)
+        return model
+
+    def predicted(self, dt):
+        """State dt frames ahead, without changing the filter"""
+        if dt <= 0:
+            return self.x
+        return self._model(dt)[0] @ self.x
+
+    def predict(self, dt):
+        if dt > 0:
+            F, Q = self._model(dt)
+            self.x = F @ self.x
+            self.P = F @ self.P @ F.T + Q
+
+    def distance(self, measurement):
+        """Squared Mahalanobis distance of a measurement from the predicted position"""
+        innovation = np.asarray(measurement, dtype=np.float64) - self.x[:2]
+        S = self.P[:2, :2] + self.R
+        return float(innovation @ np.linalg.solve(S, innovation))
+
+    def update(self, measurement):
+        innovation = np.asarray(measurement, dtype=np.float64) - self.x[:2]
+        S = self.P[:2, :2] + self.R
+        K = np.linalg.solve(S, self.P[:2, :]).T  # P H^T S^-1, using the symmetry of S
+        self.x = self.x + K @ innovation
+        self.P = (np.eye(6) - K @ self.H) @ self.P
+
+class TrackHistory:
+    """
+    Fixed-capacity ring buffer of ball track samples.
+
+    Positions, velocities, accelerations and frame numbers live in
+    contiguous float32 arrays. Every sample is written twice, at i and
+    i + capacity, so the most recent samples are always one contiguous
+    slice: the accessors return views in chronological order without
+    copying or rebuilding anything.
+    """
+
+    __slots__ = ('capacity', 'size', '_end', '_positions', '_velocities', '_accelerations', '_frames')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 0
+        self._end = 0  # Index of the next write in [0, capacity)
+        self._positions = np.zeros((2 * capacity, 2), np.float32)
+        self._velocities = np.zeros((2 * capacity, 2), np.float32)
+        self._accelerations = np.zeros((2 * capacity, 2), np.float32)
+        self._frames = np.zeros(2 * capacity, np.float32)
+
+    def __len__(self):
+        return self.size
+
+    def append(self, frame_num, position, velocity, acceleration):
+        i = self._end
+        j = i + self.capacity
+        self._positions[i] = self._positions[j] = position
+        self._velocities[i] = self._velocities[j] = velocity
+        self._accelerations[i] = self._accelerations[j] = acceleration
+        self._frames[i] = self._frames[j] = frame_num
+        self._end = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def clear(self):
+        self.size = 0
+        self._end = 0
+
+    def _window(self, n):
+        n = self.size if n is None else min(n, self.size)
+        stop = self._end + self.capacity
+        return slice(stop - n, stop)
+
+    def positions(self, n=None):
+        """(n, 2) view of the last n positions, oldest first"""
+        return self._positions[self._window(n)]
+
+    def velocities(self, n=None):
+        """(n, 2) view of the last n velocities in pixels per frame"""
+        return self._velocities[self._window(n)]
+
+    def accelerations(self, n=None):
+        """(n, 2) view of the last n accelerations in pixels per frame squared"""
+        return self._accelerations[self._window(n)]
+
+    def frames(self, n=None):
+        """(n,) view of the frame numbers of the last n samples"""
+        return self._frames[self._window(n)]
+
 class BallTracker:
-    """Class to track the cricket ball and detect events"""
+    """
+    Class to track the cricket ball and detect events.
+
+    A constant-acceleration Kalman filter carries the ball between
+    detections, so update() can be called on every frame with or without a
+    detection and the history still holds one filtered position per frame.
+    Detections far outside the predicted position are gated out. A track
+    is tentative until it has TRACK_CONFIRM_HITS detections and is dropped
+    after coasting too many frames without one. When the detector only runs
+    on every nth frame, pass that as detection_interval so the coasting
+    limits stretch accordingly.
+    """
     
-    def __init__(self, max_history=30):
-        self.positions = deque(maxlen=max_history)
-        self.velocities = deque(maxlen=max_history-1)
-        self.accelerations = deque(maxlen=max_history-2)
+    def __init__(self, max_history=30, detection_interval=1):
+        self.history = TrackHistory(max_history)
         self.last_event = None
         self.last_event_frame = -100  # Avoid multiple detections
+        self.filter = None
+        self.track_state = None  # None, 'tentative' or 'confirmed'
+        self.hits = 0
+        self.last_frame = None
+        self.last_hit_frame = None
+        self.max_coast = {state: frames * max(1, detection_interval) for state, frames in TRACK_MAX_COAST.items()}
+    
+    def _start_track(self, ball_position, frame_num):
+        self.filter = KalmanBallFilter(ball_position)
+        self.track_state = 'tentative'
+        self.hits = 1
+        self.last_hit_frame = frame_num
+    
+    def _drop_track(self):
+        self.filter = None
+        self.track_state = None
+        self.hits = 0
+        self.history.clear()
     
     def update(self, ball_position, frame_num):
         """
-        Update ball tracking with a new position.
+        Update ball tracking for a frame.
         
         Args:
-            ball_position (tuple): x, y coordinates of the ball
+            ball_position (tuple): x, y coordinates of the detected ball, or
+                                   None if there was no detection this frame
             frame_num (int): Current frame number
         """
+        if self.filter is not None:
+            self.filter.predict(frame_num - self.last_frame)
+        self.last_frame = frame_num
+        
         if ball_position:
-            self.positions.append((ball_position, frame_num))
-            
-            # Calculate velocity if we have at least two positions
-            if len(self.positions) >= 2:
-                p1, f1 = self.positions[-2]
-                p2, f2 = self.positions[-1]
-                
-                # Calculate displacement
-                dx = p2[0] - p1[0]
-                dy = p2[1] - p1[1]
-                
-                # Calculate frame difference
-                df = f2 - f1
-                
-                # Calculate velocity (pixels per frame)
-                vx = dx / df if df > 0 else 0
-                vy = dy / df if df > 0 else 0
-                
-                self.velocities.append((vx, vy, f2))
+            if self.filter is None:
+                self._start_track(ball_position, frame_num)
+            elif self.filter.distance(ball_position) <= GATE_THRESHOLD:
+                self.filter.update(ball_position)
+                self.hits += 1
+                self.last_hit_frame = frame_num
+                if self.track_state == 'tentative' and self.hits >= TRACK_CONFIRM_HITS:
+                    self.track_state = 'confirmed'
+            elif self.track_state == 'tentative':
+                # An unconfirmed track is more likely wrong than the new detection
+                self._start_track(ball_position, frame_num)
+        
+        if self.filter is None:
+            return
+        if frame_num - self.last_hit_frame > self.max_coast[self.track_state]:
+            self._drop_track()
+            return
+        
+        # Record the filtered estimate, so events see a trajectory on every frame
+        if self.track_state == 'confirmed':
+            state = self.filter.x
+            self.history.append(frame_num, state[0:2], state[2:4], state[4:6])
+    
+    def predict(self, frame_num):
+        """
+        Expected ball position at a frame, from the Kalman filter.
+        
+        Args:
+            frame_num (int): Frame to predict for
             
-            # Calculate acceleration if we have at least two velocities
-            if len(self.velocities) >= 2:
-                v1, _, f1 = self.velocities[-2]
-                v2, _, f2 = self.velocities[-1]
-                
-                # Calculate velocity change
-                dvx = v2[0] - v1[0]
-                dvy = v2[1] - v1[1]
-                
-                # Calculate frame difference
-                df = f2 - f1
-                
-                # Calculate acceleration (velocity change per frame)
-                ax = dvx / df if df > 0 else 0
-                ay = dvy / df if df > 0 else 0
-                
-                self.accelerations.append((ax, ay, f2))
+        Returns:
+            tuple: (x, y), or None if there is no live track
+        """
+        if self.filter is None:
+            return None
+        if frame_num - self.last_hit_frame > self.max_coast[self.track_state]:
+            return None
+        x, y = self.filter.predicted(frame_num - self.last_frame)[:2]
+        return (float(x), float(y))
     
     def detect_events(self, frame, objects, current_frame, timestamp):
         """
@@ -114,7 +274,7 @@ class BallTracker:
                 })
         
         # Continue with ball tracking based detection
-        if len(self.positions) < 5:
+        if len(self.history) < 5:
             return events
         
         # Skip if too close to last event
@@ -124,8 +284,8 @@ class BallTracker:
         # Get frame dimensions
         height, width = frame.shape[:2]
         
-        # Extract ball positions
-        recent_positions = [pos for pos, _ in self.positions]
+        # View of the tracked ball positions, oldest first
+        recent_positions = self.history.positions()
         
         # Check for boundary event
         if self.is_boundary(recent_positions, width, height):
@@ -171,15 +331,10 @@ class BallTracker:
         Check if the ball has reached the boundary, considering shot type.
         
         Args:
-            positions (list): Recent ball positions
+            positions (np.ndarray): Recent ball positions, shape (n, 2)
             width (int): Frame width
             height (int): Frame height
             shot_type (str, optional): Type of shot played
-        
-        Args:
-            positions (list): Recent ball positions
-            width (int): Frame width
-            height (int): Frame height
             
         Returns:
             bool: True if boundary event detected
@@ -187,42 +342,28 @@ class BallTracker:
         # Define boundary region (near edges of frame)
         boundary_margin = 50  # pixels from edge
         
-        # Check if ball position is near the boundary
+        if len(positions) < 3:
+            return False
+        
+        # Distances to the left, right, top and bottom edges
         latest_pos = positions[-1]
-        if (latest_pos[0] < boundary_margin or 
-            latest_pos[0] > width - boundary_margin or
-            latest_pos[1] < boundary_margin or
-            latest_pos[1] > height - boundary_margin):
-            
-            # Check if the ball was moving toward the boundary
-            if len(positions) >= 3:
-                direction_x = positions[-1][0] - positions[-3][0]
-                direction_y = positions[-1][1] - positions[-3][1]
-                
-                # Calculate distance to nearest edge
-                distance_to_left = latest_pos[0]
-                distance_to_right = width - latest_pos[0]
-                distance_to_top = latest_pos[1]
-                distance_to_bottom = height - latest_pos[1]
-                
-                min_distance = min(distance_to_left, distance_to_right, 
-                                  distance_to_top, distance_to_bottom)
-                
-                # Check if ball was moving toward the nearest edge
-                if (min_distance == distance_to_left and direction_x < 0) or \
-                   (min_distance == distance_to_right and direction_x > 0) or \
-                   (min_distance == distance_to_top and direction_y < 0) or \
-                   (min_distance == distance_to_bottom and direction_y > 0):
-                    return True
+        distances = np.array([latest_pos[0], width - latest_pos[0],
+                              latest_pos[1], height - latest_pos[1]])
+        nearest = int(np.argmin(distances))
+        if distances[nearest] >= boundary_margin:
+            return False
         
-        return False
+        # Check if the ball was moving toward the nearest edge
+        direction = positions[-1] - positions[-3]
+        component = direction[nearest // 2]
+        return bool(component < 0 if nearest % 2 == 0 else component > 0)
     
     def is_along_ground(self, positions):
         """
         Check if the ball was traveling along the ground (for four) or in the air (for six).
         
         Args:
-            positions (list): Recent ball positions
+            positions (np.ndarray): Recent ball positions, shape (n, 2)
             
         Returns:
             bool: True if ball was along ground, False if in air
@@ -230,14 +371,9 @@ class BallTracker:
         # This is a simplified implementation
         # A real system would use 3D tracking or estimate based on trajectory
         
-        # Check vertical component of trajectory
+        # Check if the vertical component of the trajectory is stable
         if len(positions) >= 5:
-            # Get y-coordinates
-            y_values = [pos[1] for pos in positions[-5:]]
-            
-            # Check if y values are relatively stable (along ground)
-            y_var = np.var(y_values)
-            return y_var < 100  # Threshold for variance
+            return bool(np.var(positions[-5:, 1]) < 100)  # Threshold for variance
         
         return True  # Default to four if not enough data
     
@@ -246,82 +382,124 @@ class BallTracker:
         Check if a wicket event has occurred.
         
         Args:
-            positions (list): Recent ball positions
+            positions (np.ndarray): Recent ball positions, shape (n, 2)
             stumps_objects (list): Detected stumps objects
             
         Returns:
             bool: True if wicket event detected
         """
-        if not stumps_objects:
+        if not stumps_objects or len(positions) < 3:
             return False
         
         # Get stumps location
-        stumps = stumps_objects[0]
-        stumps_bbox = stumps['bbox']
-        stumps_center = ((stumps_bbox[0] + stumps_bbox[2]) / 2, 
-                         (stumps_bbox[1] + stumps_bbox[3]) / 2)
-        
-        # Check if ball trajectory intersects with stumps
-        if len(positions) >= 3:
-            # Get recent positions
-            p1, p2, p3 = positions[-3:]
-            
-            # Calculate direction vector
-            dx = p3[0] - p1[0]
-            dy = p3[1] - p1[1]
-            
-            # Check if ball is moving toward stumps
-            vector_to_stumps = (stumps_center[0] - p3[0], stumps_center[1] - p3[1])
-            dot_product = dx * vector_to_stumps[0] + dy * vector_to_stumps[1]
-            
-            # Ball is moving toward stumps
-            if dot_product > 0:
-                # Check distance to stumps
-                distance_to_stumps = np.sqrt(vector_to_stumps[0]**2 + vector_to_stumps[1]**2)
-                
-                # Check if ball is close to stumps
-                return distance_to_stumps < 50  # Threshold in pixels
+        x1, y1, x2, y2 = stumps_objects[0]['bbox']
+        stumps_center = np.array([(x1 + x2) / 2, (y1 + y2) / 2])
         
-        return False
+        # Ball must be moving toward the stumps and be close to them
+        direction = positions[-1] - positions[-3]
+        vector_to_stumps = stumps_center - positions[-1]
+        if np.dot(direction, vector_to_stumps) <= 0:
+            return False
+        return bool(np.hypot(*vector_to_stumps) < 50)  # Threshold in pixels
     
     def is_shot_played(self, positions):
         """
         Check if a shot has been played (ball direction changed suddenly).
         
         Args:
-            positions (list): Recent ball positions
+            positions (np.ndarray): Recent ball positions, shape (n, 2)
             
         Returns:
             bool: True if shot event detected
         """
-        if len(positions) >= 5:
-            # Get recent positions
-            p1, p2, p3, p4, p5 = positions[-5:]
-            
-            # Calculate direction vectors
-            v1 = (p2[0] - p1[0], p2[1] - p1[1])
-            v2 = (p5[0] - p4[0], p5[1] - p4[1])
-            
-            # Calculate angle between vectors
-            dot_product = v1[0] * v2[0] + v1[1] * v2[1]
-            mag_v1 = np.sqrt(v1[0]**2 + v1[1]**2)
-            mag_v2 = np.sqrt(v2[0]**2 + v2[1]**2)
-            
-            # Avoid division by zero
-            if mag_v1 > 0 and mag_v2 > 0:
-                cos_angle = dot_product / (mag_v1 * mag_v2)
-                cos_angle = min(1.0, max(-1.0, cos_angle))  # Ensure valid range
-                angle = np.arccos(cos_angle) * 180 / np.pi
-                
-                # Check if angle indicates a significant direction change
-                return angle > 30  # Threshold in degrees
+        if len(positions) < 5:
+            return False
         
-        return False
+        # Direction at the start and end of the last five positions
+        steps = np.diff(positions[-5:], axis=0)
+        v1, v2 = steps[0], steps[-1]
+        magnitude = np.hypot(*v1) * np.hypot(*v2)
+        
+        # Avoid division by zero
+        if magnitude == 0:
+            return False
+        
+        cos_angle = np.clip(np.dot(v1, v2) / magnitude, -1.0, 1.0)
+        return bool(np.degrees(np.arccos(cos_angle)) > 30)  # Threshold in degrees
 
-# Global ball tracker instance
-ball_tracker = BallTracker()
+class TrackerRegistry:
+    """
+    Ball trackers keyed by stream id, one per video being analysed.
 
-def detect_events(frame, objects, poses, ball_positions, frame_num, timestamp):
+    Each stream gets its own BallTracker, so videos processed concurrently in
+    threads of one process never share trajectory state, and a finished job's
+    tracker is dropped instead of leaking into the next one. The registry
+    lock only guards the mapping; a single stream is expected to be fed by
+    one thread at a time.
+    """
+
+    def __init__(self, factory=BallTracker):
+        self._factory = factory
+        self._trackers = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._trackers)
+
+    def __contains__(self, stream_id):
+        with self._lock:
+            return stream_id in self._trackers
+
+    def open(self, stream_id, **tracker_args):
+        """
+        Create the tracker for a new stream.
+
+        Raises:
+            ValueError: If the stream already has a tracker
+        """
+        with self._lock:
+            if stream_id in self._trackers:
+                raise ValueError(f"Stream {stream_id} already has a ball tracker")
+            tracker = self._trackers[stream_id] = self._factory(**tracker_args)
+        return tracker
+
+    def get(self, stream_id):
+        """
+        Return the tracker for an open stream.
+
+        Raises:
+            KeyError: If the stream was never opened or has been closed
+        """
+        with self._lock:
+            return self._trackers[stream_id]
+
+    def close(self, stream_id):
+        """Drop a stream's tracker; closing an unknown stream is a no-op"""
+        with self._lock:
+            self._trackers.pop(stream_id, None)
+
+    @contextmanager
+    def session(self, stream_id, **tracker_args):
+        """
+        Open a tracker for the duration of a job and close it afterwards.
+
+        Usage:
+            with trackers.session(job_id) as tracker:
+                for frame_num, frame in frames:
+                    detect_events(frame, objects, poses, ball_positions,
+                                  frame_num, timestamp, stream_id=job_id)
+        """
+        tracker = self.open(stream_id, **tracker_args)
+        try:
+            yield tracker
+        finally:
+            self.close(stream_id)
+
+# Ball trackers of the videos currently being analysed
+trackers = TrackerRegistry()
+
+def detect_events(frame, objects, poses, ball_positions, frame_num, timestamp, stream_id):
     """
     Detect cricket events in the current frame.
     
@@ -332,11 +510,14 @@ def detect_events(frame, objects, poses, ball_positions, frame_num, timestamp):
         ball_positions (list): Recent ball positions with timestamps
         frame_num (int): Current frame number
         timestamp (float): Current timestamp in seconds
+        stream_id (str): Video stream whose tracker to update, opened with
+                         trackers.session() or trackers.open()
         
     Returns:
         list: Detected events
     """
     events = []
+    ball_tracker = trackers.get(stream_id)
     
     # Extract the latest ball position
     latest_ball = None
@@ -355,3 +536,53 @@ def detect_events(frame, objects, poses, ball_positions, frame_num, timestamp):
     # For example, detecting runs based on player movements
     
     return events
+
+class TrackingStage:
+    """
+    Follow the ball through a video stream and collect the events it triggers.
+
+    Frames of an (index, frame) stream pass straight through; each one is
+    searched with a RegionDetector around the position the stream's tracker
+    predicts, and the objects found are fed to detect_events. When a model
+    based DetectionStage runs on the stream instead, pass observe_detections
+    as its on_result callback. The tracker is the one opened for stream_id in
+    `trackers`, so the stage must run inside that stream's session.
+    """
+
+    def __init__(self, stream_id, fps):
+        self.stream_id = stream_id
+        self.fps = fps if fps > 0 else 30.0  # Unknown frame rate, assume broadcast default
+        self.region_detector = RegionDetector()
+        self.events = []
+
+    def __call__(self, frames):
+        tracker = trackers.get(self.stream_id)
+        for frame_index, frame in frames:
+            objects = self.region_detector.detect(frame, tracker.predict(frame_index))
+            self.observe(frame, objects, frame_index)
+            yield frame_index, frame
+
+    def observe(self, frame, objects, frame_index, ball=None):
+        """
+        Feed one frame's detections to the tracker and keep any events.
+
+        Args:
+            frame (numpy.ndarray): The frame, only its size is used
+            objects (list): Detected objects in the detect_objects format
+            frame_index (int): Index of the frame in the video
+            ball (tuple): Optional (x, y) of the ball, taken from the first
+                          'ball' object when not given
+        """
+        if ball is None:
+            ball_bbox = next((obj['bbox'] for obj in objects if obj['class'] == 'ball'), None)
+            if ball_bbox is not None:
+                ball = ((ball_bbox[0] + ball_bbox[2]) / 2, (ball_bbox[1] + ball_bbox[3]) / 2)
+        ball_positions = [{'position': ball, 'frame': frame_index}] if ball is not None else []
+        self.events.extend(detect_events(frame, objects, [], ball_positions, frame_index,
+                                         frame_index / self.fps, stream_id=self.stream_id))
+
+    def observe_detections(self, frame_index, frame_shape, detections):
+        """DetectionStage callback: feed a model's Detections for one frame to the tracker"""
+        # Event detection only reads the frame size, so a zero-stride view stands in for the frame
+        frame = np.broadcast_to(np.uint8(0), frame_shape)
+        self.observe(frame, detections.to_objects(), frame_index, detections.best_ball())
@@ -0,0 +1,76 @@
+import os
+import logging
+import queue
+import threading
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Annotated frame export is off unless enabled here or per call
+EXPORT_FRAMES = os.environ.get("EXPORT_FRAMES", "0").lower() in ("1", "true", "yes")
+EXPORT_JPEG_QUALITY = int(os.environ.get("EXPORT_JPEG_QUALITY", 80))
+EXPORT_FRAME_STRIDE = int(os.environ.get("EXPORT_FRAME_STRIDE", 1))
+
+class FrameExporter:
+    """
+    Write labelled frames to disk from a background thread.
+
+    Frames are handed over through a bounded queue, so the caller only
+    blocks if the writer falls far behind. Only every `stride`-th submitted
+    frame is written.
+    """
+
+    def __init__(self, frames_dir, quality=EXPORT_JPEG_QUALITY, stride=EXPORT_FRAME_STRIDE, max_pending=32):
+        self.frames_dir = frames_dir
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        self.stride = max(1, int(stride))
+        self.submitted = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.frames_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._write_loop, name='frame-export', daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, frame, label, confidence=None):
+        """
+        Queue a frame for export with its shot label.
+
+        Matches the on_frame(frame, label, confidence) callback of
+        ShotClassifier.classify_frame_sequence.
+        """
+        index = self.submitted
+        self.submitted += 1
+        if index % self.stride == 0:
+            self._queue.put((index, frame, label))
+
+    def close(self):
+        """Wait for all queued frames to be written"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        logger.debug(f"Exported {self.written} of {self.submitted} frames to {self.frames_dir}")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            index, frame, label = item
+            try:
+                cv2.putText(frame, str(label), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                frame_path = os.path.join(self.frames_dir, f'frame_{index:04d}.jpg')
+                cv2.imwrite(frame_path, frame, self.params)
+                self.written += 1
+            except Exception as e:
+                logger.error(f"Error exporting frame {index}: {str(e)}")
@@ -0,0 +1,111 @@
+import os
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Number of videos processed concurrently per app process
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", os.cpu_count() or 2))
+
+# Finished jobs kept around for status polling before being pruned
+MAX_FINISHED_JOBS = 500
+
+class Job:
+    """State of a single background processing job"""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = 'queued'  # queued, running, done, failed
+        self.stage = 'Waiting for a free worker...'
+        self.percent = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def update(self, stage, percent=None):
+        """
+        Report progress from inside the worker.
+
+        Args:
+            stage (str): Human readable description of the current stage
+            percent (int): Overall completion between 0 and 100
+        """
+        with self._lock:
+            self.stage = stage
+            if percent is not None:
+                self.percent = max(self.percent, min(100, int(percent)))
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'id': self.id,
+                'status': self.status,
+                'stage': self.stage,
+                'percent': self.percent,
+                'result': self.result,
+                'error': self.error
+            }
+
+class JobQueue:
+    """Bounded worker pool running processing jobs outside the HTTP request"""
+
+    def __init__(self, max_workers=JOB_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue a job and return immediately.
+
+        `fn` is called as fn(job, *args, **kwargs); its return value becomes
+        the job result and it may call job.update() to report progress.
+
+        Returns:
+            Job: The queued job
+        """
+        job = Job(str(uuid.uuid4()))
+        with self._lock:
+            self._prune()
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = 'running'
+        job.update('Starting...', 1)
+        metrics.JOBS_RUNNING.inc()
+        try:
+            with metrics.timer('job'):
+                result = fn(job, *args, **kwargs)
+            job.result = result
+            job.update('Processing complete!', 100)
+            job.status = 'done'
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.update('Processing failed')
+            job.status = 'failed'
+        finally:
+            job.finished = time.time()
+            metrics.JOBS_RUNNING.dec()
+            metrics.JOBS.inc(status=job.status)
+
+    def _prune(self):
+        """Drop the oldest finished jobs once too many have accumulated"""
+        finished = [job for job in self.jobs.values() if job.finished is not None]
+        if len(finished) <= MAX_FINISHED_JOBS:
+            return
+        finished.sort(key=lambda job: job.finished)
+        for job in finished[:len(finished) - MAX_FINISHED_JOBS]:
+            del self.jobs[job.id]
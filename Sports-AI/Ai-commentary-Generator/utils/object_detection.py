@@ -2,45 +2,329 @@ import cv2
 import numpy as np
 import logging
 import os
-from pathlib import Path
+import threading
 import urllib.request
-import time
+from pathlib import Path
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
-# Define model paths for YOLOv5
-YOLO_WEIGHTS_URL = "https://github.com/ultralytics/yolov5/releases/download/v6.1/yolov5s.pt"
-YOLO_WEIGHTS_PATH = Path("./models/yolov5s.pt")
-CRICKET_CLASSES = ['person', 'sports ball']
+# ONNX detector (e.g. a YOLOv5/YOLOv8 export) run through cv2.dnn on the CPU
+DETECTOR_MODEL_PATH = Path(os.environ.get("DETECTOR_MODEL_PATH", "./models/detector.onnx"))
+DETECTOR_MODEL_URL = os.environ.get("DETECTOR_MODEL_URL")  # Optional download location
+DETECTOR_INPUT_SIZE = int(os.environ.get("DETECTOR_INPUT_SIZE", 640))
+DETECTOR_CONFIDENCE = float(os.environ.get("DETECTOR_CONFIDENCE", 0.25))
+DETECTOR_NMS_THRESHOLD = float(os.environ.get("DETECTOR_NMS_THRESHOLD", 0.45))
+DETECTOR_BATCH_SIZE = int(os.environ.get("DETECTOR_BATCH_SIZE", 8))
+
+# Run detection on every nth sampled frame of the pipeline; 0 disables it
+DETECTION_STRIDE = int(os.environ.get("DETECTION_STRIDE", 5))
 
-def ensure_model_downloaded():
+# Class names of the model outputs, comma separated; COCO order by default
+DETECTOR_CLASSES = os.environ.get("DETECTOR_CLASSES")
+COCO_CLASSES = [
+    'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat', 'traffic light',
+    'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat', 'dog', 'horse', 'sheep', 'cow',
+    'elephant', 'bear', 'zebra', 'giraffe', 'backpack', 'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee',
+    'skis', 'snowboard', 'sports ball', 'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard',
+    'tennis racket', 'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple',
+    'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake', 'chair', 'couch',
+    'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop', 'mouse', 'remote', 'keyboard',
+    'cell phone', 'microwave', 'oven', 'toaster', 'sink', 'refrigerator', 'book', 'clock', 'vase',
+    'scissors', 'teddy bear', 'hair drier', 'toothbrush'
+]
+
+# Cricket objects reported by the pipeline, and the model class names that map onto them
+CRICKET_CLASSES = ['player', 'ball', 'stumps']
+CLASS_ALIASES = {'person': 'player', 'sports ball': 'ball', 'batsman': 'player', 'bowler': 'player',
+                 'fielder': 'player', 'wicket': 'stumps'}
+
+def ensure_model_downloaded(path=DETECTOR_MODEL_PATH, url=DETECTOR_MODEL_URL):
     """
-    Ensure the object detection model is downloaded.
-    For this example, we'll use YOLOv5 (or simulate it)
+    Make sure the ONNX detector is available locally.
+
+    The model is downloaded from `url` if it is missing and a URL is
+    configured; otherwise the caller falls back to the heuristic detector.
+
+    Returns:
+        Path: The model path, or None if no model is available
     """
-    # Create models directory if it doesn't exist
-    os.makedirs(YOLO_WEIGHTS_PATH.parent, exist_ok=True)
-    
-    # For actual implementation, download the model if not already present
-    if not YOLO_WEIGHTS_PATH.exists():
-        logger.info(f"Downloading YOLOv5 model from {YOLO_WEIGHTS_URL}")
-        try:
-            # In a real implementation, we would download the actual model
-            # For this code example, we'll simulate this part to avoid complexity
-            # urllib.request.urlretrieve(YOLO_WEIGHTS_URL, YOLO_WEIGHTS_PATH)
-            
-            # Write a placeholder file to simulate download
-            with open(YOLO_WEIGHTS_PATH, 'w') as f:
-                f.write("# This is a placeholder for the YOLOv5 model weights")
-                
-            logger.info(f"Model downloaded successfully to {YOLO_WEIGHTS_PATH}")
-        except Exception as e:
-            logger.error(f"Error downloading model: {str(e)}")
-            raise
+    path = Path(path)
+    if path.exists():
+        return path
+    if not url:
+        return None
+
+    os.makedirs(path.parent, exist_ok=True)
+    part_path = path.with_name(path.name + '.part')
+    logger.info(f"Downloading detector model from {url}")
+    try:
+        urllib.request.urlretrieve(url, part_path)
+        os.replace(part_path, path)
+    except Exception as e:
+        logger.error(f"Error downloading detector model: {str(e)}")
+        part_path.unlink(missing_ok=True)
+        return None
+    logger.info(f"Detector model saved to {path}")
+    return path
+
+class Detections:
+    """
+    Detections for one frame as parallel arrays.
+
+    boxes are (x1, y1, x2, y2) float32 in frame pixels, scores float32 and
+    class_ids int16 indices into CRICKET_CLASSES.
+    """
+
+    __slots__ = ('boxes', 'scores', 'class_ids')
+
+    def __init__(self, boxes=None, scores=None, class_ids=None):
+        self.boxes = np.empty((0, 4), np.float32) if boxes is None else boxes
+        self.scores = np.empty(0, np.float32) if scores is None else scores
+        self.class_ids = np.empty(0, np.int16) if class_ids is None else class_ids
+
+    def __len__(self):
+        return len(self.scores)
+
+    def of_class(self, name):
+        """Detections of one cricket class"""
+        mask = self.class_ids == CRICKET_CLASSES.index(name)
+        return Detections(self.boxes[mask], self.scores[mask], self.class_ids[mask])
+
+    def centers(self):
+        """(K, 2) box centres"""
+        return (self.boxes[:, :2] + self.boxes[:, 2:]) / 2
+
+    def best_ball(self):
+        """Centre (x, y) of the most confident ball, or None"""
+        balls = self.of_class('ball')
+        if not len(balls):
+            return None
+        x, y = balls.centers()[np.argmax(balls.scores)]
+        return float(x), float(y)
+
+    def to_objects(self):
+        """The list-of-dicts format returned by detect_objects"""
+        return [
+            {'class': CRICKET_CLASSES[class_id], 'bbox': tuple(int(v) for v in box), 'confidence': float(score)}
+            for box, score, class_id in zip(self.boxes, self.scores, self.class_ids)
+        ]
+
+class ObjectDetector:
+    """
+    ONNX object detector run through cv2.dnn on the CPU.
+
+    Frames are letterboxed to a square input and stacked into one
+    N x 3 x H x W blob per forward pass. Both YOLOv5-style outputs (box,
+    objectness, class scores) and YOLOv8-style outputs (box, class scores,
+    channels first) are understood. Models exported with a fixed batch size
+    of one are detected on first use and run frame by frame.
+    """
+
+    def __init__(self, model_path=DETECTOR_MODEL_PATH, input_size=DETECTOR_INPUT_SIZE,
+                 confidence=DETECTOR_CONFIDENCE, nms_threshold=DETECTOR_NMS_THRESHOLD, class_names=None):
+        self.net = cv2.dnn.readNetFromONNX(str(model_path))
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.input_size = int(input_size)
+        self.confidence = confidence
+        self.nms_threshold = nms_threshold
+        if class_names is None:
+            class_names = DETECTOR_CLASSES.split(',') if DETECTOR_CLASSES else COCO_CLASSES
+        # Model class index -> cricket class index, -1 for classes we ignore
+        names = [CLASS_ALIASES.get(name.strip(), name.strip()) for name in class_names]
+        self.class_map = np.array([CRICKET_CLASSES.index(n) if n in CRICKET_CLASSES else -1 for n in names], np.int16)
+        self.batching = True
+        self._lock = threading.Lock()  # cv2.dnn nets are not safe to run from several threads
+
+    def prepare(self, frame):
+        """
+        Letterbox a frame to the model input size.
+
+        Returns:
+            tuple: (square image, scale, (pad_x, pad_y))
+        """
+        height, width = frame.shape[:2]
+        scale = min(self.input_size / width, self.input_size / height)
+        new_w, new_h = int(round(width * scale)), int(round(height * scale))
+        pad_x, pad_y = (self.input_size - new_w) // 2, (self.input_size - new_h) // 2
+        image = np.full((self.input_size, self.input_size, 3), 114, np.uint8)
+        image[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        return image, scale, (pad_x, pad_y)
+
+    def detect_prepared(self, prepared):
+        """
+        Detect objects in frames already passed through prepare().
+
+        Returns:
+            list: One Detections per frame
+        """
+        if not prepared:
+            return []
+        images = [image for image, _, _ in prepared]
+        with metrics.timer('detect_objects'), self._lock:
+            outputs = self._forward(images)
+        return [self._postprocess(output, scale, pad) for output, (_, scale, pad) in zip(outputs, prepared)]
+
+    def detect_batch(self, frames):
+        """Detect objects in a list of BGR frames with batched forward passes"""
+        return self.detect_prepared([self.prepare(frame) for frame in frames])
+
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def _forward(self, images):
+        if self.batching and len(images) > 1:
+            try:
+                self.net.setInput(cv2.dnn.blobFromImages(images, 1 / 255.0, swapRB=True))
+                return self.net.forward()
+            except cv2.error:
+                logger.info("Detector does not accept batched input, running frame by frame")
+                self.batching = False
+        outputs = []
+        for image in images:
+            self.net.setInput(cv2.dnn.blobFromImage(image, 1 / 255.0, swapRB=True))
+            outputs.append(self.net.forward()[0])
+        return outputs
+
+    def _postprocess(self, output, scale, pad):
+        rows = np.asarray(output, np.float32)
+        if rows.ndim == 3:
+            rows = rows[0]
+        n_classes = len(self.class_map)
+        if rows.shape[0] == 4 + n_classes and rows.shape[1] != 4 + n_classes:
+            rows = rows.T  # YOLOv8: channels first
+        if rows.shape[1] == 5 + n_classes:
+            class_scores = rows[:, 5:] * rows[:, 4:5]
+        else:
+            class_scores = rows[:, 4:4 + n_classes]
+
+        # Only the classes that map onto a cricket object are scored
+        known = self.class_map >= 0
+        class_scores = class_scores[:, known]
+        model_ids = np.flatnonzero(known)
+        best = np.argmax(class_scores, axis=1)
+        scores = class_scores[np.arange(len(rows)), best]
+        keep = scores >= self.confidence
+        if not keep.any():
+            return Detections()
+
+        boxes_xywh = rows[keep, :4].copy()
+        boxes_xywh[:, 0] -= boxes_xywh[:, 2] / 2
+        boxes_xywh[:, 1] -= boxes_xywh[:, 3] / 2
+        scores = scores[keep]
+        class_ids = self.class_map[model_ids[best[keep]]]
+
+        indices = cv2.dnn.NMSBoxesBatched(boxes_xywh.tolist(), scores.tolist(), class_ids.tolist(),
+                                          self.confidence, self.nms_threshold)
+        indices = np.asarray(indices, np.intp).reshape(-1)
+
+        # Undo the letterbox
+        boxes = boxes_xywh[indices]
+        boxes[:, 2:] += boxes[:, :2]
+        boxes[:, [0, 2]] -= pad[0]
+        boxes[:, [1, 3]] -= pad[1]
+        boxes /= scale
+        return Detections(boxes.astype(np.float32), scores[indices].astype(np.float32), class_ids[indices])
+
+class DetectionStage:
+    """
+    Detect objects on every nth frame of an (index, frame) stream.
+
+    Frames pass straight through; the selected ones are letterboxed as they
+    go by, so the original frames are never held, and detection runs once a
+    batch is full. Results are kept as (frame index, Detections) pairs and,
+    in frame order, passed to on_result(frame_index, frame_shape, detections)
+    if given.
+    """
+
+    def __init__(self, detector, stride=DETECTION_STRIDE, batch_size=DETECTOR_BATCH_SIZE, on_result=None):
+        self.detector = detector
+        self.stride = max(1, int(stride))
+        self.batch_size = max(1, int(batch_size))
+        self.on_result = on_result
+        self.results = []
+        self._pending = []
+        self._seen = 0
+
+    def __call__(self, frames):
+        for frame_index, frame in frames:
+            if self._seen % self.stride == 0:
+                self._pending.append((frame_index, frame.shape, self.detector.prepare(frame)))
+                if len(self._pending) >= self.batch_size:
+                    self._flush()
+            self._seen += 1
+            yield frame_index, frame
+        self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        detections = self.detector.detect_prepared([prepared for _, _, prepared in self._pending])
+        for (frame_index, frame_shape, _), frame_detections in zip(self._pending, detections):
+            self.results.append((frame_index, frame_detections))
+            if self.on_result is not None:
+                self.on_result(frame_index, frame_shape, frame_detections)
+        self._pending = []
+
+    def summary(self):
+        """Number of frames run through the detector and objects found per class"""
+        counts = dict.fromkeys(CRICKET_CLASSES, 0)
+        for _, detections in self.results:
+            for class_id in detections.class_ids:
+                counts[CRICKET_CLASSES[class_id]] += 1
+        return {'frames': len(self.results), 'objects': counts}
+
+_detector = None
+_detector_loaded = False
+_detector_lock = threading.Lock()
+
+def get_detector():
+    """
+    Return the process-wide ONNX detector, loading it on first use.
+
+    Returns:
+        ObjectDetector: The detector, or None if no model is available
+    """
+    global _detector, _detector_loaded
+    if not _detector_loaded:
+        with _detector_lock:
+            if not _detector_loaded:
+                path = ensure_model_downloaded()
+                if path is None:
+                    logger.warning(f"No detector model at {DETECTOR_MODEL_PATH}, using heuristic detection")
+                else:
+                    try:
+                        _detector = ObjectDetector(path)
+                        logger.info(f"Loaded detector model from {path}")
+                    except cv2.error as e:
+                        logger.error(f"Could not load detector model {path}: {str(e)}")
+                _detector_loaded = True
+    return _detector
 
 def detect_objects(frame):
     """
-    Detect cricket-related objects in a frame using a pre-trained model.
+    Detect cricket-related objects in a frame.
+
+    Uses the ONNX detector when a model is available and the heuristic
+    detector otherwise.
+
+    Args:
+        frame (numpy.ndarray): Input frame
+
+    Returns:
+        list: Detected objects with bounding boxes and classes
+    """
+    detector = get_detector()
+    if detector is not None:
+        return detector.detect(frame).to_objects()
+    with metrics.timer('detect_objects'):
+        return detect_objects_heuristic(frame)
+
+def detect_objects_heuristic(frame):
+    """
+    Approximate detection from thresholds and Hough transforms, used when no
+    detector model is available.
     
     Args:
         frame (numpy.ndarray): Input frame
@@ -48,12 +332,6 @@ def detect_objects(frame):
     Returns:
         list: Detected objects with bounding boxes and classes
     """
-    # Ensure model is available
-    # ensure_model_downloaded()
-    
-    # In a real implementation, we would load and use YOLOv5 here
-    # For this example, we'll simulate object detection with a simple approach
-    
     # Convert to grayscale for simpler processing
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
     
@@ -125,3 +403,141 @@ def detect_objects(frame):
                 })
     
     return detected_objects
+
+# Region-of-interest ball search around the tracker's predicted position
+BALL_ROI_RADIUS = int(os.environ.get("BALL_ROI_RADIUS", 64))
+# Whole-frame searches run on a pyramid level at most this wide
+FULL_SEARCH_MAX_WIDTH = int(os.environ.get("FULL_SEARCH_MAX_WIDTH", 960))
+
+BALL_MIN_RADIUS = 5
+BALL_MAX_RADIUS = 15
+
+def _find_circles(gray, scale=1.0, votes=30):
+    """HoughCircles tuned for the ball, with radii and votes scaled to the image"""
+    circles = cv2.HoughCircles(
+        gray, cv2.HOUGH_GRADIENT, dp=1, minDist=max(1, int(50 * scale)),
+        param1=50, param2=max(10, int(votes * scale)),
+        minRadius=max(1, int(BALL_MIN_RADIUS * scale)), maxRadius=max(2, int(round(BALL_MAX_RADIUS * scale)))
+    )
+    return circles[0] if circles is not None else np.empty((0, 3), np.float32)
+
+class RegionDetector:
+    """
+    Heuristic detector that avoids full-resolution whole-frame searches.
+
+    The ball is searched at full resolution only in a window around the
+    position predicted by the ball tracker. When there is no prediction, or
+    nothing is found there, the whole frame is searched on a downscaled
+    pyramid level and the hit is refined in a full-resolution window.
+    Players and stumps are always found on the downscaled level.
+
+    stats counts the frames seen and how many needed a whole-frame search.
+    """
+
+    # Accumulator votes needed inside the window. A small window holds few
+    # false edges, so this can be lower than a whole-frame search needs to
+    # pick up a 5 px ball.
+    ROI_VOTES = 15
+    MAX_CANDIDATES = 3
+
+    def __init__(self, roi_radius=BALL_ROI_RADIUS, max_width=FULL_SEARCH_MAX_WIDTH):
+        self.roi_radius = roi_radius
+        self.max_width = max_width
+        self.stats = {'frames': 0, 'roi_hits': 0, 'full_searches': 0}
+
+    def full_search_fraction(self):
+        """Fraction of frames that needed a whole-frame ball search"""
+        return self.stats['full_searches'] / self.stats['frames'] if self.stats['frames'] else 0.0
+
+    def _pyramid(self, gray):
+        """Downscale by halving until the image is at most max_width wide"""
+        scale = 1.0
+        while gray.shape[1] > self.max_width:
+            gray = cv2.pyrDown(gray)
+            scale /= 2
+        return gray, scale
+
+    def _search_window(self, gray, center):
+        """Best ball circle within roi_radius of center, in frame coordinates"""
+        height, width = gray.shape[:2]
+        x, y = int(center[0]), int(center[1])
+        x1, y1 = max(0, x - self.roi_radius), max(0, y - self.roi_radius)
+        x2, y2 = min(width, x + self.roi_radius), min(height, y + self.roi_radius)
+        if x2 - x1 <= 2 * BALL_MAX_RADIUS or y2 - y1 <= 2 * BALL_MAX_RADIUS:
+            return None
+        circles = _find_circles(gray[y1:y2, x1:x2], votes=self.ROI_VOTES)
+        if not len(circles):
+            return None
+        cx, cy, radius = circles[0]
+        return cx + x1, cy + y1, radius
+
+    def detect(self, frame, predicted_ball=None):
+        """
+        Detect objects in a frame.
+
+        Args:
+            frame (numpy.ndarray): BGR frame
+            predicted_ball (tuple): Optional (x, y) where the tracker expects the ball
+
+        Returns:
+            list: Detected objects in the detect_objects format
+        """
+        with metrics.timer('detect_objects_roi'):
+            return self._detect(frame, predicted_ball)
+
+    def _detect(self, frame, predicted_ball):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        height = frame.shape[0]
+        small, scale = self._pyramid(gray)
+        self.stats['frames'] += 1
+        detected_objects = []
+
+        # Players from the downscaled frame
+        _, thresh = cv2.threshold(small, 100, 255, cv2.THRESH_BINARY)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for contour in contours:
+            if cv2.contourArea(contour) > 500 * scale * scale:
+                x, y, w, h = cv2.boundingRect(contour)
+                if h > w and h > 100 * scale:
+                    detected_objects.append({
+                        'class': 'player',
+                        'bbox': (int(x / scale), int(y / scale), int((x + w) / scale), int((y + h) / scale)),
+                        'confidence': 0.8
+                    })
+
+        # Ball: full resolution near the prediction, downscaled whole frame otherwise
+        ball = self._search_window(gray, predicted_ball) if predicted_ball is not None else None
+        if ball is not None:
+            self.stats['roi_hits'] += 1
+            metrics.BALL_SEARCHES.inc(mode='roi')
+        else:
+            self.stats['full_searches'] += 1
+            metrics.BALL_SEARCHES.inc(mode='full')
+            # Candidates from the coarse level only count once confirmed at full resolution
+            for candidate in _find_circles(small, scale, votes=self.ROI_VOTES)[:self.MAX_CANDIDATES]:
+                ball = self._search_window(gray, candidate[:2] / scale)
+                if ball is not None:
+                    break
+        if ball is not None:
+            cx, cy, radius = ball
+            detected_objects.append({
+                'class': 'ball',
+                'bbox': (int(cx - radius), int(cy - radius), int(cx + radius), int(cy + radius)),
+                'confidence': 0.7
+            })
+
+        # Stumps from the downscaled frame
+        edges = cv2.Canny(small, 50, 150)
+        lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=max(10, int(100 * scale)),
+                                minLineLength=100 * scale, maxLineGap=10 * scale)
+        if lines is not None:
+            for line in lines:
+                x1, y1, x2, y2 = (line[0] / scale).astype(int)
+                if abs(x2 - x1) < 20 and abs(y2 - y1) > 100 and y2 > height * 0.6:
+                    detected_objects.append({
+                        'class': 'stumps',
+                        'bbox': (x1 - 10, y1, x2 + 10, y2),
+                        'confidence': 0.6
+                    })
+
+        return detected_objects
@@ -0,0 +1,165 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed store of finished processing results
+CACHE_DIR = Path(os.environ.get("RESULT_CACHE_DIR", "./static/cache"))
+CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_hash_memo = {}
+_hash_memo_lock = threading.Lock()
+
+def hash_file(path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    SHA-256 of a file, read in fixed-size chunks.
+
+    Results are remembered per (path, size, mtime) so an unchanged file,
+    such as the demo sample, is only read once per process.
+
+    Args:
+        path (str): File to hash
+        chunk_size (int): Bytes read per chunk
+
+    Returns:
+        str: Hex digest
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _hash_memo_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    content_hash = digest.hexdigest()
+
+    with _hash_memo_lock:
+        _hash_memo[memo_key] = content_hash
+    return content_hash
+
+def remember_hash(path, content_hash):
+    """Record a hash computed elsewhere (e.g. while uploading) so hash_file() need not read the file"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _hash_memo_lock:
+        _hash_memo[memo_key] = content_hash
+
+def link_or_copy(src, dst):
+    """Hardlink src to dst, falling back to a copy across filesystems"""
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+class ResultCache:
+    """
+    On-disk cache of processing results keyed by video content.
+
+    Each entry is a directory holding result.json and the output files.
+    The modification time of result.json records the last access, and the
+    least recently used entries are evicted once the cache grows past
+    max_bytes.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(content_hash, language, model_version):
+        """Cache key for a video's content, commentary language and model version"""
+        raw = f"{content_hash}:{language}:{model_version}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        Returns:
+            dict: Stored result data with a 'files' mapping of name to cached
+                  path, or None on a miss
+        """
+        entry = self.root / key
+        meta_path = entry / 'result.json'
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            files = {name: str(entry / filename) for name, filename in result.pop('_files', {}).items()}
+            if not all(os.path.exists(path) for path in files.values()):
+                return None
+            os.utime(meta_path)  # Mark as recently used
+        except (OSError, ValueError):
+            return None
+
+        result['files'] = files
+        logger.info(f"Result cache hit for {key}")
+        return result
+
+    def put(self, key, data, files=None):
+        """
+        Store a result.
+
+        Args:
+            key (str): Cache key from key()
+            data (dict): JSON-serializable result data
+            files (dict): Optional mapping of name to output file to store with it
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        entry = self.root / key
+        tmp_entry = self.root / f".{key}.{uuid.uuid4().hex}.tmp"
+        tmp_entry.mkdir()
+        try:
+            stored = {}
+            for name, path in (files or {}).items():
+                if path and os.path.exists(path):
+                    filename = name + os.path.splitext(path)[1]
+                    link_or_copy(path, tmp_entry / filename)
+                    stored[name] = filename
+            with open(tmp_entry / 'result.json', 'w', encoding='utf-8') as f:
+                json.dump(dict(data, _files=stored), f)
+
+            with self._lock:
+                if entry.exists():
+                    shutil.rmtree(entry, ignore_errors=True)
+                os.replace(tmp_entry, entry)
+        finally:
+            if tmp_entry.exists():
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in self.root.iterdir():
+                meta_path = entry / 'result.json'
+                if not entry.is_dir() or not meta_path.exists():
+                    continue
+                size = sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+                entries.append((meta_path.stat().st_mtime, size, entry))
+                total += size
+
+            entries.sort()
+            for _, size, entry in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+                logger.info(f"Evicted result cache entry {entry.name}")
@@ -1,9 +1,16 @@
 
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import cv2
+import joblib
 import logging
+from pathlib import Path
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -12,48 +19,255 @@ CRICKET_SHOTS = [
     "sweep_shot", "helicopter_shot"
 ]
 
-class ShotClassifier:
+# Trained model artifact written by train_classifier.py
+MODEL_PATH = Path(os.environ.get("SHOT_MODEL_PATH", "./models/shot_classifier.joblib"))
+MODEL_FORMAT_VERSION = 1
+
+# Feature rows stacked into one matrix per forest call during inference
+INFERENCE_BATCH_SIZE = 128
+
+# Threads used for feature extraction (OpenCV releases the GIL)
+FEATURE_WORKERS = int(os.environ.get("FEATURE_WORKERS", os.cpu_count() or 1))
+
+def _batched(iterable, size):
+    """Yield lists of up to `size` consecutive items from an iterable"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class FeatureExtractor:
+    """
+    Frame featurizer (HOG, Canny edges and intensity histogram).
+
+    The HOG descriptor and all intermediate buffers are created once and
+    reused, and features are written straight into float32 output rows.
+    An instance is not thread-safe; use one per thread.
+    """
+
+    SIZE = (128, 128)
+    HIST_BINS = 32
+
     def __init__(self):
-        self.templates = self._load_templates()
-        self.model = RandomForestClassifier(n_estimators=100, random_state=42)
+        # Extract HOG features with adjusted parameters
+        win_size = self.SIZE
+        block_size = (16, 16)
+        block_stride = (8, 8)
+        cell_size = (8, 8)
+        nbins = 9
+        self.hog = cv2.HOGDescriptor(win_size, block_size, block_stride, cell_size, nbins)
+
+        self.hog_size = self.hog.getDescriptorSize()
+        self.edge_size = self.SIZE[0] * self.SIZE[1]
+        self.n_features = self.hog_size + self.edge_size + self.HIST_BINS
+
+        self._gray = None
+        self._resized = np.empty(self.SIZE[::-1], dtype=np.uint8)
+        self._edges = np.empty(self.SIZE[::-1], dtype=np.uint8)
+        self._row = np.empty(self.n_features, dtype=np.float32)
+
+    def extract(self, frame, out=None):
+        """
+        Extract features from a single BGR frame.
+
+        Args:
+            frame (numpy.ndarray): BGR frame of any size
+            out (numpy.ndarray): Optional float32 row of length n_features to write into
+
+        Returns:
+            numpy.ndarray: The feature row (`out`, or an internal buffer that
+                           is overwritten by the next call)
+        """
+        row = self._row if out is None else out
+
+        # Convert to grayscale and resize for consistent features
+        if self._gray is None or self._gray.shape != frame.shape[:2]:
+            self._gray = np.empty(frame.shape[:2], dtype=np.uint8)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        cv2.resize(self._gray, self.SIZE, dst=self._resized)
+
+        hog_end = self.hog_size
+        edge_end = hog_end + self.edge_size
+        row[:hog_end] = self.hog.compute(self._resized).ravel()
+
+        # Intensity histogram; its cumulative sum also gives the median for Canny
+        hist = cv2.calcHist([self._resized], [0], None, [256], [0, 256]).ravel()
+        cumulative = np.cumsum(hist)
+        half = self.edge_size / 2
+        median = (np.searchsorted(cumulative, half) + np.searchsorted(cumulative, half + 1)) / 2
+
+        # Add edge features using Canny with adaptive thresholds
+        lower = int(max(0, (1.0 - 0.33) * median))
+        upper = int(min(255, (1.0 + 0.33) * median))
+        cv2.Canny(self._resized, lower, upper, edges=self._edges)
+        np.multiply(self._edges.ravel(), np.float32(1 / 255.0), out=row[hog_end:edge_end])
+
+        # Add normalized intensity histogram features
+        np.divide(hist.reshape(self.HIST_BINS, -1).sum(axis=1), self.edge_size, out=row[edge_end:])
+
+        return row
+
+    def extract_batch(self, frames, out=None):
+        """
+        Extract features for a batch of frames into one matrix.
+
+        Args:
+            frames (list or numpy.ndarray): BGR frames, or an N x H x W x 3 array
+            out (numpy.ndarray): Optional float32 matrix of at least len(frames) rows
+
+        Returns:
+            tuple: (features, valid) where features is an N x n_features float32
+                   matrix and valid marks rows whose extraction succeeded
+        """
+        n = len(frames)
+        if out is None or out.shape[0] < n:
+            out = np.empty((n, self.n_features), dtype=np.float32)
+        features = out[:n]
+        valid = np.ones(n, dtype=bool)
+        for i, frame in enumerate(frames):
+            try:
+                self.extract(frame, out=features[i])
+            except Exception as e:
+                logger.error(f"Error in feature extraction: {str(e)}")
+                valid[i] = False
+        return features, valid
+
+class ParallelFeatureExtractor:
+    """
+    FeatureExtractor spread over a thread pool.
+
+    Each worker thread owns its own FeatureExtractor and fills a contiguous
+    slice of the output matrix, so row order always matches input order.
+    Safe to share between threads.
+    """
+
+    # Smallest number of frames worth handing to a separate worker
+    MIN_CHUNK = 2
+
+    def __init__(self, workers=FEATURE_WORKERS):
+        self.workers = max(1, int(workers))
+        self.n_features = FeatureExtractor().n_features
+        self._local = threading.local()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def group_size(self):
+        """Frames to gather from a stream so every worker gets a chunk"""
+        return self.workers * self.MIN_CHUNK
+
+    def _extractor(self):
+        extractor = getattr(self._local, 'extractor', None)
+        if extractor is None:
+            extractor = self._local.extractor = FeatureExtractor()
+        return extractor
+
+    def _pool(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='features')
+        return self._executor
+
+    def extract(self, frame, out=None):
+        """Extract features from a single frame in the calling thread"""
+        return self._extractor().extract(frame, out=out)
+
+    def extract_batch(self, frames, out=None):
+        """
+        Extract features for a batch of frames across the worker threads.
+
+        Args:
+            frames (list or numpy.ndarray): BGR frames, or an N x H x W x 3 array
+            out (numpy.ndarray): Optional float32 matrix of at least len(frames) rows
+
+        Returns:
+            tuple: (features, valid) as returned by FeatureExtractor.extract_batch
+        """
+        n = len(frames)
+        if out is None or out.shape[0] < n:
+            out = np.empty((n, self.n_features), dtype=np.float32)
+        features = out[:n]
+
+        chunk = max(self.MIN_CHUNK, -(-n // self.workers))
+        if self.workers == 1 or n <= chunk:
+            return self._extractor().extract_batch(frames, out=features)
+
+        def run(start):
+            stop = min(start + chunk, n)
+            return self._extractor().extract_batch(frames[start:stop], out=features[start:stop])[1]
+
+        valid = np.concatenate(list(self._pool().map(run, range(0, n, chunk))))
+        return features, valid
+
+class ShotClassifier:
+    def __init__(self, load_templates=True, feature_workers=FEATURE_WORKERS):
+        self.feature_extractor = ParallelFeatureExtractor(feature_workers)
+        self.templates = self._load_templates() if load_templates else {}
+        self.model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
         self.scaler = StandardScaler()
         self.is_trained = False
-        
+        self.version = 'templates'  # Identifies the model in result cache keys
+
+    def save(self, path=MODEL_PATH):
+        """
+        Save scaler, forest and templates to a single model artifact.
+
+        The artifact is written uncompressed so it can be memory-mapped on load.
+
+        Args:
+            path (str): Destination of the artifact
+        """
+        path = Path(path)
+        os.makedirs(path.parent, exist_ok=True)
+        artifact = {
+            'format_version': MODEL_FORMAT_VERSION,
+            'scaler': self.scaler,
+            'model': self.model,
+            'templates': self.templates,
+            'is_trained': self.is_trained
+        }
+        # Write next to the destination and rename so readers never see a partial file
+        tmp_path = path.with_name(path.name + '.tmp')
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, path)
+        logger.info(f"Shot classifier saved to {path}")
+
+    @classmethod
+    def load(cls, path=MODEL_PATH, mmap_mode='r'):
+        """
+        Load a classifier from a model artifact.
+
+        Args:
+            path (str): Path of the artifact written by save()
+            mmap_mode (str): joblib memory-map mode for the stored arrays
+
+        Returns:
+            ShotClassifier: Ready to use classifier
+        """
+        artifact = joblib.load(path, mmap_mode=mmap_mode)
+        if artifact.get('format_version') != MODEL_FORMAT_VERSION:
+            raise ValueError(f"Unsupported shot classifier artifact version: {artifact.get('format_version')}")
+
+        classifier = cls(load_templates=False)
+        classifier.scaler = artifact['scaler']
+        classifier.model = artifact['model']
+        classifier.model.n_jobs = -1  # Use every core for batched inference
+        classifier.templates = artifact['templates']
+        classifier.is_trained = artifact['is_trained']
+        stat = os.stat(path)
+        classifier.version = f"{MODEL_FORMAT_VERSION}-{stat.st_size}-{stat.st_mtime_ns}"
+        logger.info(f"Shot classifier loaded from {path} (trained: {classifier.is_trained})")
+        return classifier
+
     def extract_features(self, frame):
         """Extract features from a frame"""
         try:
-            # Convert to grayscale and resize for consistent features
-            frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            frame_resized = cv2.resize(frame_gray, (128, 128))  # Increased resolution
-            
-            # Extract HOG features with adjusted parameters
-            win_size = (128, 128)
-            block_size = (16, 16)
-            block_stride = (8, 8)
-            cell_size = (8, 8)
-            nbins = 9
-            hog = cv2.HOGDescriptor(win_size, block_size, block_stride, cell_size, nbins)
-            hog_features = hog.compute(frame_resized)
-            
-            # Add edge features using Canny with adaptive thresholds
-            median = np.median(frame_resized)
-            lower = int(max(0, (1.0 - 0.33) * median))
-            upper = int(min(255, (1.0 + 0.33) * median))
-            edges = cv2.Canny(frame_resized, lower, upper)
-            edge_features = edges.flatten() / 255.0
-            
-            # Add intensity histogram features
-            hist_features = cv2.calcHist([frame_resized], [0], None, [32], [0, 256]).flatten()
-            hist_features = hist_features / hist_features.sum()  # Normalize
-            
-            # Combine all features
-            features = np.concatenate([
-                hog_features.flatten(),
-                edge_features,
-                hist_features
-            ])
-            
-            return features
+            return self.feature_extractor.extract(frame).copy()
         except Exception as e:
             logger.error(f"Error in feature extraction: {str(e)}")
             return None
@@ -65,17 +279,11 @@ class ShotClassifier:
         
         # Process each shot type and its frames
         for shot_type, frames in frames_dict.items():
-            frame_count = 0
-            for frame in frames:
-                try:
-                    features = self.extract_features(frame)
-                    if features is not None:
-                        X.append(features)
-                        y.append(shot_type)
-                        frame_count += 1
-                except Exception as e:
-                    logger.error(f"Error extracting features: {str(e)}")
-                    continue
+            features, valid = self.feature_extractor.extract_batch(frames)
+            frame_count = int(valid.sum())
+            if frame_count:
+                X.append(features[valid])
+                y.extend([shot_type] * frame_count)
             logger.info(f"Processed {frame_count} frames for {shot_type}")
                 
         if not X or not y:
@@ -83,7 +291,7 @@ class ShotClassifier:
             return False
                 
         # Convert to numpy arrays
-        X = np.array(X)
+        X = np.concatenate(X)
         y = np.array(y)
         
         # Scale features
@@ -136,93 +344,187 @@ class ShotClassifier:
                 
         return templates
 
-    def classify_frame_sequence(self, frames):
-        """Classify cricket shot from a sequence of frames"""
-        if not frames:
+    def predict_batch(self, frames):
+        """
+        Classify a batch of frames with a single forest call.
+
+        Args:
+            frames (list): BGR frames
+
+        Returns:
+            tuple: (label indices into model.classes_, confidences, valid) where
+                   the first two only cover frames whose features could be
+                   extracted and valid marks those frames
+        """
+        with metrics.timer('extract_features'):
+            features, valid = self.feature_extractor.extract_batch(frames)
+        return self._predict_features(features, valid)
+
+    def _predict_features(self, features, valid):
+        """Run one forest call over the valid rows of a feature matrix"""
+        metrics.FRAMES_CLASSIFIED.inc(len(features))
+        if not valid.any():
+            return np.empty(0, dtype=np.intp), np.empty(0), valid
+
+        with metrics.timer('inference'):
+            features_scaled = self.scaler.transform(features[valid])
+            proba = self.model.predict_proba(features_scaled)
+        label_indices = np.argmax(proba, axis=1)
+        confidences = proba[np.arange(len(proba)), label_indices]
+        return label_indices, confidences, valid
+
+    def classify_frame_sequence(self, frames, batch_size=INFERENCE_BATCH_SIZE, on_frame=None):
+        """
+        Classify cricket shot from a sequence (or stream) of frames.
+
+        Frames are featurized as they arrive, a few at a time across the
+        extractor threads, into a preallocated batch_size x n_features
+        matrix, and the forest runs once per full matrix. Only those small
+        groups of raw frames are held, unless on_frame needs them back with
+        their predictions.
+
+        Args:
+            frames (iterable): BGR frames
+            batch_size (int): Feature rows per forest call
+            on_frame (callable): Optional on_frame(frame, label, confidence)
+                                 called with each frame's own prediction
+        """
+        if frames is None or (isinstance(frames, (list, tuple)) and not frames):
             return "unknown", 0.0
             
         if not self.is_trained:
             logger.warning("Model not trained, falling back to template matching")
-            return self._template_matching_classify(frames)
+            return self._template_matching_classify(frames, on_frame)
             
-        predictions = []
-        confidences = []
-        
-        for frame in frames:
+        label_batches = []
+        confidence_batches = []
+        extractor = self.feature_extractor
+        group_size = min(batch_size, extractor.group_size)
+        features = np.empty((batch_size, extractor.n_features), dtype=np.float32)
+        valid = np.zeros(batch_size, dtype=bool)
+        pending = []  # Raw frames of the filled rows, kept only for on_frame
+        filled = 0
+
+        def classify_filled():
             try:
-                # Extract features
-                features = self.extract_features(frame)
-                features_scaled = self.scaler.transform(features.reshape(1, -1))
-                
-                # Get prediction and confidence
-                prediction = self.model.predict(features_scaled)[0]
-                proba = self.model.predict_proba(features_scaled)[0]
-                confidence = np.max(proba)
-                
-                predictions.append(prediction)
-                confidences.append(confidence)
-                
+                label_indices, confidences, ok = self._predict_features(features[:filled], valid[:filled])
+                label_batches.append(label_indices)
+                confidence_batches.append(confidences)
+                if on_frame:
+                    valid_frames = (frame for frame, frame_ok in zip(pending, ok) if frame_ok)
+                    for frame, index, confidence in zip(valid_frames, label_indices, confidences):
+                        on_frame(frame, self.model.classes_[index], float(confidence))
             except Exception as e:
                 logger.error(f"Error in shot classification: {str(e)}")
-                continue
+            pending.clear()
+
+        for group in _batched(frames, group_size):
+            if filled + len(group) > batch_size:
+                classify_filled()
+                filled = 0
+            stop = filled + len(group)
+            with metrics.timer('extract_features'):
+                _, valid[filled:stop] = extractor.extract_batch(group, out=features[filled:stop])
+            if on_frame:
+                pending.extend(group)
+            filled = stop
+            if filled == batch_size:
+                classify_filled()
+                filled = 0
+        if filled:
+            classify_filled()
                 
-        if not predictions:
+        labels = np.concatenate(label_batches) if label_batches else np.empty(0, dtype=np.intp)
+        if len(labels) == 0:
             return "unknown", 0.0
+        confidences = np.concatenate(confidence_batches)
             
-        # Get most common prediction with weighted confidence
-        prediction_counts = {}
-        prediction_confidences = {}
-        
-        for pred, conf in zip(predictions, confidences):
-            if pred not in prediction_counts:
-                prediction_counts[pred] = 0
-                prediction_confidences[pred] = []
-            prediction_counts[pred] += 1
-            prediction_confidences[pred].append(conf)
+        # Weight by both frequency and mean confidence of each predicted shot
+        n_classes = len(self.model.classes_)
+        counts = np.bincount(labels, minlength=n_classes)
+        confidence_sums = np.bincount(labels, weights=confidences, minlength=n_classes)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_confidences = np.where(counts > 0, confidence_sums / counts, 0.0)
+        weighted_scores = counts / len(labels) * mean_confidences
             
-        # Weight by both frequency and confidence
-        weighted_scores = {}
-        for pred in prediction_counts:
-            count_weight = prediction_counts[pred] / len(predictions)
-            conf_weight = np.mean(prediction_confidences[pred])
-            weighted_scores[pred] = count_weight * conf_weight
-            
-        best_shot = max(weighted_scores.items(), key=lambda x: x[1])[0]
-        best_confidence = weighted_scores[best_shot]
+        best_index = int(np.argmax(weighted_scores))
+        best_shot = self.model.classes_[best_index]
+        best_confidence = weighted_scores[best_index]
         
         return best_shot, float(best_confidence)
         
-    def _template_matching_classify(self, frames):
+    def _template_matching_classify(self, frames, on_frame=None):
         """Legacy template matching classification as fallback"""
         if not self.templates:
             return "unknown", 0.0
             
         best_shot = None
         best_confidence = 0.0
+        classified = 0
+        matching_time = 0.0
         
         for frame in frames:
+            started = time.perf_counter()
             try:
+                classified += 1
                 frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
                 frame_resized = cv2.resize(frame_gray, (64, 64))
+                frame_shot = "unknown"
+                frame_confidence = 0.0
                 
                 for shot_type, template in self.templates.items():
                     result = cv2.matchTemplate(frame_resized, template, cv2.TM_CCOEFF_NORMED)
                     similarity = np.max(result)
                     
+                    if similarity > frame_confidence:
+                        frame_confidence = similarity
+                        frame_shot = shot_type
                     if similarity > best_confidence:
                         best_confidence = similarity
                         best_shot = shot_type
                         
+                if on_frame:
+                    on_frame(frame, frame_shot, float(frame_confidence))
+                        
             except Exception as e:
                 logger.error(f"Error in template matching: {str(e)}")
                 continue
+            finally:
+                matching_time += time.perf_counter() - started
+
+        metrics.FRAMES_CLASSIFIED.inc(classified)
+        metrics.STAGE_SECONDS.observe(matching_time, stage='template_matching')
                 
         if not best_shot:
             return "unknown", 0.0
             
         return best_shot, float(best_confidence)
 
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_classifier():
+    """
+    Return the process-wide shot classifier, loading it on first use.
+
+    The trained artifact at MODEL_PATH is used when present, otherwise an
+    untrained classifier that falls back to template matching.
+    """
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                if MODEL_PATH.exists():
+                    try:
+                        _classifier = ShotClassifier.load(MODEL_PATH)
+                    except Exception as e:
+                        logger.error(f"Error loading shot classifier from {MODEL_PATH}: {str(e)}")
+                if _classifier is None:
+                    logger.warning(f"No trained shot classifier at {MODEL_PATH}, using template matching")
+                    _classifier = ShotClassifier()
+    return _classifier
+
 def classify_shot(frame_sequence):
     """Wrapper function for shot classification"""
-    classifier = ShotClassifier()
+    classifier = get_classifier()
     return classifier.classify_frame_sequence(frame_sequence)
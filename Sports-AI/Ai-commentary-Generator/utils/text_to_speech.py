@@ -1,52 +1,275 @@
 import os
+import io
+import re
+import uuid
+import hashlib
 import logging
-import time
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from gtts import gTTS
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
-def text_to_speech(text, output_path, language='en'):
+# Phrase-level audio cache
+TTS_CACHE_DIR = Path(os.environ.get("TTS_CACHE_DIR", "./cache/tts"))
+TTS_CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+# Concurrent backend calls across all requests
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", 8))
+
+# Longest piece of text sent to the backend in one call
+MAX_CHUNK_LENGTH = 500
+
+# Map internal language codes to gTTS codes
+LANG_MAP = {
+    'en': 'en',
+    'hi': 'hi',
+    'ta': 'ta'
+}
+
+# Sentence boundaries: Latin punctuation and the danda (।) used in Hindi and Tamil text
+SENTENCE_END = re.compile(r'(?<=[.!?।])\s+')
+
+class TTSBackend:
+    """Interface for speech synthesis backends"""
+
+    name = 'base'
+
+    def synthesize(self, text, language):
+        """
+        Synthesize speech.
+
+        Args:
+            text (str): Text to speak
+            language (str): Language code ('en', 'hi', 'ta')
+
+        Returns:
+            bytes: MP3 audio
+        """
+        raise NotImplementedError
+
+class GTTSBackend(TTSBackend):
+    """Google Text-to-Speech (gTTS)"""
+
+    name = 'gtts'
+
+    def synthesize(self, text, language):
+        tts_lang = LANG_MAP.get(language, 'en')  # Default to English if language is not supported
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=tts_lang, slow=False).write_to_fp(buffer)
+        return buffer.getvalue()
+
+class SilentBackend(TTSBackend):
     """
-    Convert text to speech and save as audio file with language support.
-    Optimized for Tamil language support.
-    
+    Offline stand-in producing silent MP3 audio, for tests and benchmarks.
+
+    Output length grows with the text like real speech would, so timing and
+    concatenation behave realistically without network access.
+    """
+
+    name = 'silent'
+
+    # One MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, mono, zeroed side info (silence)
+    FRAME = bytes([0xFF, 0xFB, 0x90, 0xC0]) + bytes(413)
+    FRAMES_PER_CHAR = 2  # ~26 ms per frame, roughly normal speaking pace
+
+    def synthesize(self, text, language):
+        return self.FRAME * max(1, len(text) * self.FRAMES_PER_CHAR)
+
+class PhraseAudioCache:
+    """
+    On-disk cache of synthesized phrases keyed by (text, language, backend).
+
+    An in-memory LRU index of segment sizes with a running total is built
+    from disk on first use, so storing a phrase never rescans the cache;
+    least recently used segments are evicted once the total passes
+    max_bytes. File modification times record the last access, which
+    restores the LRU order when the index is rebuilt after a restart.
+    """
+
+    def __init__(self, root=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None  # OrderedDict of path -> size, least recently used first
+        self._total = 0
+
+    def _path(self, text, language, backend_name):
+        key = hashlib.sha256(f"{backend_name}:{language}:{text}".encode('utf-8')).hexdigest()
+        return self.root / key[:2] / f"{key}.mp3"
+
+    def _load_index(self):
+        """Build the LRU index from the segments on disk; call with the lock held"""
+        segments = []
+        for path in self.root.glob('*/*.mp3'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            segments.append((stat.st_mtime, path, stat.st_size))
+        segments.sort()
+        self._index = OrderedDict((path, size) for _, path, size in segments)
+        self._total = sum(self._index.values())
+
+    def _touch(self, path, size):
+        """Record a segment as most recently used; call with the lock held"""
+        if self._index is None:
+            self._load_index()
+        self._total += size - self._index.pop(path, 0)
+        self._index[path] = size
+
+    def get(self, text, language, backend_name):
+        """Return cached MP3 bytes for a phrase, or None"""
+        path = self._path(text, language, backend_name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            return None
+        with self._lock:
+            self._touch(path, len(data))
+        return data
+
+    def put(self, text, language, backend_name, data):
+        """Store MP3 bytes for a phrase"""
+        path = self._path(text, language, backend_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._touch(path, len(data))
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used segments until the cache fits in max_bytes"""
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            while self._total > self.max_bytes and self._index:
+                path, size = self._index.popitem(last=False)
+                path.unlink(missing_ok=True)
+                self._total -= size
+
+default_backend = GTTSBackend()
+phrase_cache = PhraseAudioCache()
+
+@lru_cache(maxsize=1)
+def _transition_pattern():
+    """Regex matching any transition the commentary generator can emit, longest first"""
+    from utils.commentary_generator import TRANSITIONS, TAMIL_TEMPLATES
+
+    transitions = {t for group in TRANSITIONS.values() for t in group}
+    transitions.update(TAMIL_TEMPLATES["transitions"])
+    transitions = sorted({t.strip() for t in transitions}, key=len, reverse=True)
+    return re.compile('(' + '|'.join(re.escape(t) for t in transitions) + ')')
+
+def split_phrases(text, language='en'):
+    """
+    Split commentary into cacheable phrases.
+
+    Text is split into sentences, and transition phrases from the commentary
+    templates (e.g. "Meanwhile, ") are split off the sentences around them, so
+    commentary built from the templates maps onto a small fixed set of phrases.
+    Transitions of every language are split off, since the generator mixes
+    them (Hindi commentary uses the English transitions).
+
     Args:
-        text (str): Commentary text to convert
-        output_path (str): Path to save the audio file
+        text (str): Commentary text
         language (str): Language code ('en', 'hi', 'ta')
 
+    Returns:
+        list: Phrases in speaking order
+    """
+    transition_pattern = _transition_pattern()
+
+    phrases = []
+    for sentence in SENTENCE_END.split(text.strip()):
+        for part in transition_pattern.split(sentence):
+            part = part.strip()
+            if part:
+                phrases.append(part)
+    return phrases
+
+def synthesize_phrase(text, language='en', backend=None, cache=None):
+    """
+    Audio for a single phrase, synthesized at most once per language.
+
+    Returns:
+        bytes: MP3 audio for the phrase
+    """
+    backend = backend or default_backend
+    cache = cache or phrase_cache
+    data = cache.get(text, language, backend.name)
+    if data is None:
+        metrics.TTS_CACHE_REQUESTS.inc(result='miss')
+        with metrics.timer('tts_synthesize'):
+            data = backend.synthesize(text, language)
+        cache.put(text, language, backend.name, data)
+    else:
+        metrics.TTS_CACHE_REQUESTS.inc(result='hit')
+    return data
+
+def warm_phrase_cache(language='en', backend=None, cache=None):
+    """
+    Synthesize every template phrase for a language ahead of time.
+
+    Returns:
+        int: Number of phrases in the cache for this language
+    """
+    from utils.commentary_generator import COMMENTARY_TEMPLATES, TRANSITIONS, TAMIL_TEMPLATES
+
+    # Tamil transitions are part of its templates; every other language gets the English ones
+    templates = TAMIL_TEMPLATES if language == 'ta' else COMMENTARY_TEMPLATES
+    texts = [] if language == 'ta' else list(TRANSITIONS['en'])
+    for group in templates.values():
+        if isinstance(group, dict):
+            for sentences in group.values():
+                texts.extend(sentences)
+        else:
+            texts.extend(group)
+
+    phrases = {phrase for text in texts for phrase in split_phrases(text, language)}
+    for phrase in phrases:
+        synthesize_phrase(phrase, language, backend, cache)
+    return len(phrases)
+
+def text_to_speech(text, output_path, language='en', backend=None, cache=None):
+    """
+    Convert text to speech and save as audio file with language support.
+
+    The text is split into phrases and each phrase is synthesized once per
+    language and kept in the phrase cache. Uncached phrases are synthesized
+    concurrently and the commentary audio is joined from the MP3 segments,
+    so template commentary rarely needs a TTS call at all.
+
     Args:
         text (str): Commentary text to convert
         output_path (str): Path to save the audio file
         language (str): Language code ('en', 'hi', 'ta')
+        backend (TTSBackend): Synthesis backend, defaults to gTTS
+        cache (PhraseAudioCache): Phrase cache, defaults to the shared one
 
     Returns:
         bool: True if successful, False otherwise
     """
+    backend = backend or default_backend
     try:
         logger.info(f"Converting text to speech: {text[:100]}...")
 
-        # If the text is too long, split it
-        if len(text) > 5000:
-            chunks = split_long_text(text)
-            logger.info(f"Text is long, split into {len(chunks)} chunks")
-            return process_text_chunks(chunks, output_path, language)
-
-        # Map internal language codes to gTTS codes
-        lang_map = {
-            'en': 'en',
-            'hi': 'hi',
-            'ta': 'ta'
-        }
-        tts_lang = lang_map.get(language, 'en') # Default to English if language is not supported
-
-        # Use Google Text-to-Speech (gTTS)
-        tts = gTTS(text=text, lang=tts_lang, slow=False)
-
-        # Save to output file
-        tts.save(output_path)
+        # Phrases that are still too long are split further on word boundaries
+        phrases = split_phrases(text, language)
+        chunks = [chunk for phrase in phrases for chunk in split_long_text(phrase, MAX_CHUNK_LENGTH)]
+        if not process_text_chunks(chunks, output_path, language, backend, cache):
+            raise RuntimeError("Synthesis of commentary chunks failed")
 
-        logger.info(f"Text-to-speech conversion completed. Saved to {output_path}")
+        logger.info(f"Text-to-speech conversion completed ({len(chunks)} chunks). Saved to {output_path}")
         return True
 
     except Exception as e:
@@ -55,18 +278,59 @@ def text_to_speech(text, output_path, language='en'):
         # Create a fallback audio file with a simple message
         try:
             fallback_text = "Commentary audio could not be generated. Please check the logs for more information."
-            fallback_tts = gTTS(text=fallback_text, lang='en', slow=False)
-            fallback_tts.save(output_path)
+            with open(output_path, 'wb') as f:
+                f.write(backend.synthesize(fallback_text, 'en'))
             logger.info(f"Created fallback audio file at {output_path}")
         except Exception as fallback_e:
             logger.error(f"Failed to create fallback audio file: {str(fallback_e)}")
 
         return False
 
+# Runs whole-commentary syntheses; separate from the chunk pool they submit work to
+_commentary_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix='tts-commentary')
+
+def text_to_speech_async(text, output_path, language='en', backend=None, cache=None):
+    """
+    Start converting text to speech in the background.
+
+    The audio is written to a temporary file and atomically renamed to
+    output_path only when synthesis succeeded, so a consumer never sees a
+    partially written file. Any stale file at output_path is removed first.
+
+    Args:
+        text (str): Commentary text to convert
+        output_path (str): Path to save the audio file
+        language (str): Language code ('en', 'hi', 'ta')
+        backend (TTSBackend): Synthesis backend, defaults to gTTS
+        cache (PhraseAudioCache): Phrase cache, defaults to the shared one
+
+    Returns:
+        concurrent.futures.Future: Resolves to True once output_path is
+                                   complete, or False if synthesis failed
+    """
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    part_path = f"{output_path}.part"
+
+    def run():
+        success = text_to_speech(text, part_path, language, backend, cache)
+        if success:
+            os.replace(part_path, output_path)
+        elif os.path.exists(part_path):
+            os.remove(part_path)
+        return success
+
+    return _commentary_executor.submit(run)
+
 def split_long_text(text, max_length=5000):
     """
     Split long text into smaller chunks for TTS processing.
 
+    Sentences are detected on '.', '!', '?' and the danda (।) used in Hindi
+    and Tamil, then packed into chunks of at most max_length characters.
+    A single sentence longer than max_length is split on whitespace, and
+    any word longer than max_length is cut into max_length slices.
+
     Args:
         text (str): Long text to split
         max_length (int): Maximum length of each chunk
@@ -74,26 +338,35 @@ def split_long_text(text, max_length=5000):
     Returns:
         list: List of text chunks
     """
-    # Split text into sentences
-    sentences = text.split('. ')
-
     chunks = []
     current_chunk = ""
 
-    for sentence in sentences:
-        # Add period back if it was removed during split
-        if not sentence.endswith('.'):
-            sentence += '.'
+    for sentence in SENTENCE_END.split(text.strip()):
+        # Break up sentences that can never fit in a chunk
+        pieces = [sentence]
+        if len(sentence) > max_length:
+            pieces = []
+            piece = ""
+            for word in sentence.split():
+                if piece and len(piece) + len(word) + 1 > max_length:
+                    pieces.append(piece)
+                    piece = ""
+                while len(word) > max_length:
+                    pieces.append(word[:max_length])
+                    word = word[max_length:]
+                piece = f"{piece} {word}" if piece else word
+            if piece:
+                pieces.append(piece)
 
-        # If adding this sentence would exceed max length, start a new chunk
-        if len(current_chunk) + len(sentence) + 1 > max_length:
-            chunks.append(current_chunk)
-            current_chunk = sentence
-        else:
-            # Add a space before appending if the chunk is not empty
-            if current_chunk:
-                current_chunk += ' '
-            current_chunk += sentence
+        for piece in pieces:
+            # If adding this sentence would exceed max length, start a new chunk
+            if current_chunk and len(current_chunk) + len(piece) + 1 > max_length:
+                chunks.append(current_chunk)
+                current_chunk = piece
+            elif current_chunk:
+                current_chunk += ' ' + piece
+            else:
+                current_chunk = piece
 
     # Add the last chunk if not empty
     if current_chunk:
@@ -101,43 +374,116 @@ def split_long_text(text, max_length=5000):
 
     return chunks
 
-def process_text_chunks(chunks, output_path, language='en'):
+# Bitrates (kbps) indexed by the 4-bit header field, for MPEG-1 and MPEG-2/2.5 Layer III
+_MP3_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    25: (11025, 12000, 8000),
+}
+
+def _mp3_frame_length(data, pos):
+    """Length of the Layer III frame starting at pos, or 0 if there is no valid header"""
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return 0
+    version_bits = (data[pos + 1] >> 3) & 0x03
+    layer_bits = (data[pos + 1] >> 1) & 0x03
+    bitrate_index = data[pos + 2] >> 4
+    sample_rate_index = (data[pos + 2] >> 2) & 0x03
+    padding = (data[pos + 2] >> 1) & 0x01
+    if version_bits == 1 or layer_bits != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return 0
+
+    version = {3: 1, 2: 2, 0: 25}[version_bits]
+    bitrate = _MP3_BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+    samples = 144 if version == 1 else 72
+    return samples * bitrate // sample_rate + padding
+
+def iter_mp3_frames(data):
+    """
+    Yield the audio frames of an MP3 byte string.
+
+    ID3 tags, Xing/Info/VBRI header frames (which describe only their own
+    file) and any junk between frames are skipped, so the frames of several
+    files can be written back to back as one valid stream without decoding.
+
+    Args:
+        data (bytes): MP3 file contents
+
+    Yields:
+        memoryview: One complete MPEG audio frame at a time
+    """
+    view = memoryview(data)
+    pos = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F)
+        pos = 10 + size + (10 if data[5] & 0x10 else 0)
+
+    first = True
+    while pos < len(data):
+        length = _mp3_frame_length(data, pos)
+        if not length or pos + length > len(data):
+            pos += 1  # Resynchronise on the next frame header
+            continue
+        frame = view[pos:pos + length]
+        pos += length
+        if first:
+            first = False
+            # Search a bytes copy: `in` on a memoryview compares single items
+            head = frame[:48].tobytes()
+            if b'Xing' in head or b'Info' in head or head[36:40] == b'VBRI':
+                continue
+        yield frame
+
+# Bounded pool shared by all requests, so concurrent jobs cannot flood the TTS service
+_tts_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix='tts')
+
+def process_text_chunks(chunks, output_path, language='en', backend=None, cache=None):
     """
     Process chunks of text and create a single audio file.
-    For demo purposes, we'll only process the first chunk.
+
+    All uncached chunks are synthesized concurrently on the shared TTS pool,
+    then their MP3 frames are written to the output in chunk order in a
+    single streaming pass, without re-encoding. Each chunk is written as
+    soon as it and all chunks before it are ready, so the total time is
+    close to that of the slowest chunk.
 
     Args:
         chunks (list): List of text chunks
         output_path (str): Path to save the audio file
         language (str): Language code ('en', 'hi', 'ta')
+        backend (TTSBackend): Synthesis backend, defaults to gTTS
+        cache (PhraseAudioCache): Phrase cache, defaults to the shared one
 
     Returns:
         bool: True if successful, False otherwise
     """
+    if not chunks:
+        return False
+
+    futures = {}
     try:
-        # For demo purposes, just use the first chunk
-        # In a real implementation, we would combine multiple audio files
-        if chunks:
-            first_chunk = chunks[0]
-            lang_map = {
-                'en': 'en',
-                'hi': 'hi',
-                'ta': 'ta'
-            }
-            tts_lang = lang_map.get(language, 'en')
-            tts = gTTS(text=first_chunk, lang=tts_lang, slow=False)
-            tts.save(output_path)
-
-            logger.info(f"Created audio from first chunk (of {len(chunks)}). Saved to {output_path}")
-
-            # Add a note about using only the first part
-            if len(chunks) > 1:
-                logger.warning("Only using first part of commentary for demo purposes.")
-
-            return True
-        else:
-            return False
+        # Repeated chunks are only synthesized once
+        for chunk in chunks:
+            if chunk not in futures:
+                futures[chunk] = _tts_executor.submit(synthesize_phrase, chunk, language, backend, cache)
+
+        frame_count = 0
+        with open(output_path, 'wb') as f:
+            for chunk in chunks:
+                for frame in iter_mp3_frames(futures[chunk].result()):
+                    f.write(frame)
+                    frame_count += 1
+
+        logger.info(f"Created audio from {len(chunks)} chunks ({frame_count} MP3 frames). Saved to {output_path}")
+        return True
 
     except Exception as e:
         logger.error(f"Error processing text chunks: {str(e)}")
-        return False
\ No newline at end of file
+        for future in futures.values():
+            future.cancel()
+        return False
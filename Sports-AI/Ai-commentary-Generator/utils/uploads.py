@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Partial uploads live here until they are finalized
+PARTIAL_UPLOAD_DIR = Path(os.environ.get("PARTIAL_UPLOAD_DIR", "./static/uploads/partial"))
+
+# Bytes read from the request stream at a time
+UPLOAD_READ_SIZE = 1024 * 1024
+
+# Uploads with no chunk received for this long are abandoned and pruned when new ones start
+UPLOAD_RETENTION_SECONDS = int(os.environ.get("UPLOAD_RETENTION_HOURS", 24)) * 3600
+
+class UploadError(Exception):
+    """Raised for invalid chunked upload operations"""
+
+class UploadOffsetError(UploadError):
+    """Raised when a chunk does not start at the current end of the upload"""
+
+    def __init__(self, expected_offset):
+        super().__init__(f"Chunk must start at offset {expected_offset}")
+        self.expected_offset = expected_offset
+
+class UploadSession:
+    """State of one resumable upload"""
+
+    def __init__(self, upload_id, filename, total_size, directory, created=None):
+        self.id = upload_id
+        self.filename = filename
+        self.total_size = total_size
+        self.created = time.time() if created is None else created
+        self.path = Path(directory) / f"{upload_id}.part"
+        self.meta_path = Path(directory) / f"{upload_id}.json"
+        self.offset = 0
+        self.digest = hashlib.sha256()
+        self.lock = threading.Lock()
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'size': self.total_size,
+            'offset': self.offset
+        }
+
+class UploadManager:
+    """
+    Resumable chunked uploads streamed straight to disk.
+
+    Chunks must arrive in order; each is copied from the request stream to
+    the partial file in fixed-size blocks, so memory use is constant, and
+    the SHA-256 of the content is updated as the bytes arrive. The partial
+    file's modification time is the last write; uploads idle for longer
+    than the retention period are deleted when a new upload starts.
+    """
+
+    def __init__(self, directory=PARTIAL_UPLOAD_DIR, max_size=None, retention_seconds=UPLOAD_RETENTION_SECONDS):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.retention_seconds = retention_seconds
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, filename, total_size):
+        """
+        Start a new upload.
+
+        Args:
+            filename (str): Sanitized original file name
+            total_size (int): Expected size of the complete file in bytes
+
+        Returns:
+            UploadSession: The new upload
+        """
+        if total_size <= 0:
+            raise UploadError("Upload size must be positive")
+        if self.max_size is not None and total_size > self.max_size:
+            raise UploadError(f"Upload exceeds the maximum size of {self.max_size} bytes")
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.prune()
+        session = UploadSession(uuid.uuid4().hex, filename, total_size, self.directory)
+        session.path.touch()
+        with open(session.meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'filename': filename, 'size': total_size, 'created': session.created}, f)
+        with self._lock:
+            self.sessions[session.id] = session
+        return session
+
+    def prune(self):
+        """
+        Delete uploads that received no data within the retention period.
+
+        Returns:
+            int: Number of uploads removed
+        """
+        cutoff = time.time() - self.retention_seconds
+        pruned = 0
+        with self._lock:
+            upload_ids = {path.stem for path in self.directory.glob('*.json')}
+            upload_ids.update(path.stem for path in self.directory.glob('*.part'))
+            for upload_id in upload_ids:
+                part_path = self.directory / f"{upload_id}.part"
+                meta_path = self.directory / f"{upload_id}.json"
+                try:
+                    last_write = (part_path if part_path.exists() else meta_path).stat().st_mtime
+                except FileNotFoundError:
+                    continue  # Finalized meanwhile
+                if last_write >= cutoff:
+                    continue
+
+                # Leave uploads that are in the middle of a chunk alone
+                session = self.sessions.get(upload_id)
+                if session is not None and not session.lock.acquire(blocking=False):
+                    continue
+                try:
+                    part_path.unlink(missing_ok=True)
+                    meta_path.unlink(missing_ok=True)
+                    self.sessions.pop(upload_id, None)
+                finally:
+                    if session is not None:
+                        session.lock.release()
+                pruned += 1
+        if pruned:
+            logger.info(f"Pruned {pruned} abandoned uploads")
+        return pruned
+
+    def get(self, upload_id):
+        """
+        Look up an upload, restoring it from disk after a restart.
+
+        Returns:
+            UploadSession: The upload, or None if it does not exist
+        """
+        with self._lock:
+            session = self.sessions.get(upload_id)
+            if session is not None:
+                return session
+            if not upload_id.isalnum():
+                return None
+            meta_path = self.directory / f"{upload_id}.json"
+            if not meta_path.exists():
+                return None
+
+            # Rebuild the running hash from the bytes already received
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            session = UploadSession(upload_id, meta['filename'], meta['size'], self.directory,
+                                    created=meta.get('created', meta_path.stat().st_mtime))
+            with open(session.path, 'rb') as f:
+                for block in iter(lambda: f.read(UPLOAD_READ_SIZE), b''):
+                    session.digest.update(block)
+                    session.offset += len(block)
+            self.sessions[upload_id] = session
+            logger.info(f"Resumed upload {upload_id} at offset {session.offset}")
+            return session
+
+    def write_chunk(self, session, offset, stream, length=None):
+        """
+        Append a chunk read from a stream.
+
+        Args:
+            session (UploadSession): Target upload
+            offset (int): Byte offset the chunk starts at
+            stream: File-like object to read the chunk from
+            length (int): Optional number of bytes to read
+
+        Returns:
+            int: The new upload offset
+        """
+        with session.lock:
+            if offset != session.offset:
+                raise UploadOffsetError(session.offset)
+
+            remaining = session.total_size - session.offset
+            if length is not None and length > remaining:
+                raise UploadError("Chunk extends past the declared upload size")
+            to_copy = remaining if length is None else length
+
+            with open(session.path, 'ab') as f:
+                while to_copy > 0:
+                    block = stream.read(min(UPLOAD_READ_SIZE, to_copy))
+                    if not block:
+                        break
+                    f.write(block)
+                    session.digest.update(block)
+                    session.offset += len(block)
+                    to_copy -= len(block)
+
+            if stream.read(1):
+                raise UploadError("Chunk extends past the declared upload size")
+            return session.offset
+
+    def finalize(self, session, destination):
+        """
+        Move a complete upload to its final location.
+
+        Args:
+            session (UploadSession): Completed upload
+            destination (str): Final path of the file
+
+        Returns:
+            str: SHA-256 hex digest of the uploaded content
+        """
+        with session.lock:
+            if session.offset != session.total_size:
+                raise UploadError(f"Upload incomplete: {session.offset} of {session.total_size} bytes received")
+            os.replace(session.path, destination)
+            session.meta_path.unlink(missing_ok=True)
+            content_hash = session.digest.hexdigest()
+        with self._lock:
+            self.sessions.pop(session.id, None)
+        return content_hash
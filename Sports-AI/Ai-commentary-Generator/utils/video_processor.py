@@ -1,71 +1,381 @@
 import os
 import logging
-import shutil
 from pathlib import Path
 import random
 import time
+import queue
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Optional
 import cv2
-from flask import session, redirect, url_for
 import numpy as np
+from utils.frame_export import FrameExporter, EXPORT_FRAMES
+from utils.result_cache import link_or_copy
+from utils.object_detection import DetectionStage, DETECTION_STRIDE, get_detector
+from utils.event_detection import TrackingStage, trackers
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
-def process_video(input_path, output_path, sample_rate=3, unique_id=None, language='en'):  # Process every 3rd frame for better performance
+# Number of decoded frames allowed to wait between the decode thread and the classifier
+PREFETCH_DEPTH = 8
+
+# Gaps (in frames) shorter than this are grabbed through instead of seeking,
+# since a seek restarts decoding from the previous keyframe
+SEEK_MIN_GAP = 30
+
+DECODE_MODES = ('read', 'grab', 'seek')
+
+def read_frames(input_path, sample_rate=1, stats=None):
+    """
+    Decode every frame of a video and keep every nth one.
+
+    Args:
+        input_path (str): Path to input video
+        sample_rate (int): Keep every nth frame
+        stats (dict): Optional dict whose 'decoded' count tracks the read position
+
+    Yields:
+        tuple: (frame_index, frame) for every kept frame
+    """
+    cap = cv2.VideoCapture(input_path)
+    try:
+        frame_index = 0
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if stats is not None:
+                stats['decoded'] = frame_index + 1
+            if frame_index % sample_rate == 0:
+                yield frame_index, frame
+            frame_index += 1
+    finally:
+        cap.release()
+
+def grab_frames(input_path, sample_rate=1, stats=None):
+    """
+    Keep every nth frame of a video, skipping the rest with grab().
+
+    grab() only demuxes and decodes into the codec's internal buffer; the
+    colour conversion and copy into a numpy array done by retrieve() is only
+    paid for kept frames.
+
+    Args:
+        input_path (str): Path to input video
+        sample_rate (int): Keep every nth frame
+        stats (dict): Optional dict whose 'decoded' count tracks the read position
+
+    Yields:
+        tuple: (frame_index, frame) for every kept frame
+    """
+    cap = cv2.VideoCapture(input_path)
+    try:
+        frame_index = 0
+        while cap.isOpened():
+            if not cap.grab():
+                break
+            if stats is not None:
+                stats['decoded'] = frame_index + 1
+            if frame_index % sample_rate == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                yield frame_index, frame
+            frame_index += 1
+    finally:
+        cap.release()
+
+def seek_frames(input_path, frames_per_second, stats=None):
+    """
+    Sample a video by timestamp, e.g. 2 frames for every second of video.
+
+    Long gaps are skipped by seeking with CAP_PROP_POS_MSEC; short gaps are
+    grabbed through, which is cheaper than decoding again from a keyframe.
+
+    Args:
+        input_path (str): Path to input video
+        frames_per_second (float): Frames to keep per second of video
+        stats (dict): Optional dict whose 'decoded' count tracks the read position
+
+    Yields:
+        tuple: (frame_index, frame) for every kept frame
+    """
+    cap = cv2.VideoCapture(input_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if fps <= 0:
+            fps = 30.0  # Unknown frame rate, assume broadcast default
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        step_ms = 1000.0 / frames_per_second
+
+        position = 0  # Index of the next frame the decoder will return
+        timestamp_ms = 0.0
+        while cap.isOpened():
+            target = int(round(timestamp_ms * fps / 1000.0))
+            if total_frames > 0 and target >= total_frames:
+                break
+
+            if target < position:
+                target = position
+            elif target - position >= SEEK_MIN_GAP:
+                cap.set(cv2.CAP_PROP_POS_MSEC, timestamp_ms)
+                position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+            while position < target and cap.grab():
+                position += 1
+
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if stats is not None:
+                stats['decoded'] = position + 1
+            yield position, frame
+            position += 1
+            timestamp_ms += step_ms
+    finally:
+        cap.release()
+
+def decode_frames(input_path, sample_rate=3, frames_per_second=None, mode=None, stats=None):
+    """
+    Decode only the frames the pipeline will analyse.
+
+    Args:
+        input_path (str): Path to input video
+        sample_rate (int): Keep every nth frame ('read' and 'grab' modes)
+        frames_per_second (float): Frames per second of video to keep ('seek' mode)
+        mode (str): One of DECODE_MODES; defaults to 'seek' when
+                    frames_per_second is given, otherwise 'grab'
+        stats (dict): Optional dict whose 'decoded' count tracks the read position
+
+    Yields:
+        tuple: (frame_index, frame) for every kept frame
+    """
+    if mode is None:
+        mode = 'seek' if frames_per_second else 'grab'
+    if mode == 'read':
+        return read_frames(input_path, sample_rate, stats)
+    if mode == 'grab':
+        return grab_frames(input_path, sample_rate, stats)
+    if mode == 'seek':
+        if not frames_per_second:
+            raise ValueError("frames_per_second is required for seek decoding")
+        return seek_frames(input_path, frames_per_second, stats)
+    raise ValueError(f"Unknown decode mode: {mode}")
+
+def count_frames(frames, stats=None):
+    """
+    Strip frame indices from a decoded stream, counting the frames that pass.
+
+    Args:
+        frames (iterable): (frame_index, frame) pairs
+        stats (dict): Optional dict whose 'sampled' count is incremented
+
+    Yields:
+        numpy.ndarray: Sampled BGR frames
+    """
+    for _, frame in frames:
+        if stats is not None:
+            stats['sampled'] = stats.get('sampled', 0) + 1
+        yield frame
+
+def prefetch(iterable, depth=PREFETCH_DEPTH):
+    """
+    Run an iterable in a background thread behind a bounded queue.
+
+    OpenCV releases the GIL while decoding, so the next frames are decoded
+    while the consumer is still classifying the current ones. At most
+    `depth` items are buffered at any time.
+
+    Args:
+        iterable (iterable): Source iterable (e.g. a frame generator)
+        depth (int): Maximum number of buffered items
+
+    Yields:
+        Items of the source iterable, in order
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(entry):
+        """Queue an entry unless the consumer has stopped; returns False if it has"""
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except Exception as e:
+            put((done, e))
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        worker.join()
+
+@dataclass
+class VideoProcessingResult:
+    """Everything process_video produces for one clip"""
+
+    events: list
+    commentary: str
+    processed_video: Optional[str]  # None if the caller skipped it
+    commentary_audio: Optional[str] = None  # None if synthesis failed
+    merged_video: Optional[str] = None  # None if the audio could not be muxed in
+    shot_type: Optional[str] = None
+    confidence: float = 0.0
+    duration: float = 0.0
+    frame_count: int = 0
+    sampled_frames: int = 0
+    detections: dict = field(default_factory=dict)  # Frames run through the detector and objects per class
+    timings: dict = field(default_factory=dict)  # Seconds spent per stage
+
+    @property
+    def output_video(self):
+        """The video to show: with commentary if the merge worked, otherwise the plain copy (if any)"""
+        return self.merged_video or self.processed_video
+
+    def to_dict(self):
+        return asdict(self)
+
+def _report_decode_progress(frames, stats, total_frames, progress, every=10):
+    """Pass frames through while reporting decode progress every few frames"""
+    for frame in frames:
+        if total_frames > 0 and stats['sampled'] % every == 0:
+            progress('Analyzing video frames...', 5 + 55 * min(1.0, stats['decoded'] / total_frames))
+        yield frame
+
+def process_video(input_path, output_path, sample_rate=3, unique_id=None, language='en', progress=None,
+                  frames_per_second=None, export_frames=None, tts_backend=None, detection_stride=None,
+                  link_video=True):  # Process every 3rd frame for better performance
     """
     Process a cricket video using CNN classification and generate commentary.
 
+    Frames are decoded, sampled and classified as a stream, so memory use
+    stays bounded regardless of the length of the clip. The ball is tracked
+    through the sampled frames with a tracker opened for this job, and the
+    boundaries and shots it picks up are added to the events.
+
+    This function does not touch any web framework state, so it can run in
+    worker threads, separate processes or batch jobs; the caller decides
+    what to do with the result.
+
     Args:
         input_path (str): Path to input video
-        output_path (str): Path to save processed video
+        output_path (str): Path to save processed video; the commentary audio
+                           and merged video are written next to it
         sample_rate (int): Process every nth frame (for performance)
-        unique_id (str): Unique identifier for the processed video.
+        unique_id (str): Unique identifier for the output files and the
+                         ball tracker stream, defaults to the input file name
+        progress (callable): Optional progress(stage, percent) callback
+        frames_per_second (float): If set, sample this many frames per second
+                                   of video by timestamp instead of every nth frame
+        export_frames (bool): Write annotated frames to static/frames in the
+                              background; defaults to EXPORT_FRAMES
+        tts_backend (TTSBackend): Speech synthesis backend, defaults to gTTS
+        detection_stride (int): Run the object detector on every nth sampled
+                                frame and track the ball from its boxes, 0 to
+                                use the heuristic ROI search instead; defaults
+                                to DETECTION_STRIDE. Needs a detector model.
+        link_video (bool): Expose the input at output_path as the processed
+                           video; False skips it, e.g. when the input is on
+                           another filesystem and would have to be copied
 
     Returns:
-        list: Detected events with timestamps and descriptions
+        VideoProcessingResult: Events, commentary and output paths
     """
     logger.info(f"Processing video: {input_path}")
 
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"Video file not found: {input_path}")
 
-    # Read video
+    # Read video properties
     cap = cv2.VideoCapture(input_path)
-    frames = []
-    frame_count = 0
     fps = cap.get(cv2.CAP_PROP_FPS)
-
-    # Create directory for storing frames
-    frames_dir = os.path.join('static/frames', os.path.basename(input_path).split('.')[0])
-    os.makedirs(frames_dir, exist_ok=True)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = total_frames / fps if fps > 0 else 0
-
-    # Extract frames
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        if frame_count % sample_rate == 0:
-            # Save frame with timestamp
-            frame_path = os.path.join(frames_dir, f'frame_{frame_count:04d}.jpg')
-            cv2.imwrite(frame_path, frame)
-            frames.append(frame)
-        frame_count += 1
-
     cap.release()
+    duration = total_frames / fps if fps > 0 else 0
 
+    timings = {}
+    started = time.perf_counter()
+    if unique_id is None:
+        unique_id = os.path.splitext(os.path.basename(input_path))[0]
+
+
+    # Decode -> sample pipeline, consumed lazily by the classifier below
+    stats = {'decoded': 0, 'sampled': 0}
+    decoded = metrics.timed_iter(decode_frames(input_path, sample_rate, frames_per_second, stats=stats), 'decode')
+
+    # Ball tracking runs in the decode thread, alongside classification. With a
+    # detector model the ball and stumps come from its boxes on every nth sampled
+    # frame; otherwise the ball is searched near the tracker's prediction on
+    # every sampled frame.
+    tracking = TrackingStage(unique_id, fps)
+    if detection_stride is None:
+        detection_stride = DETECTION_STRIDE
+    detector = get_detector() if detection_stride > 0 else None
+    if detector is not None:
+        detection = DetectionStage(detector, detection_stride, on_result=tracking.observe_detections)
+        decoded = detection(decoded)
+    else:
+        detection = None
+        decoded = tracking(decoded)
+    frames = prefetch(count_frames(decoded, stats))
+    if progress:
+        frames = _report_decode_progress(frames, stats, total_frames, progress)
+
+    # One ball tracker per job, freed when the job ends
+    sample_step = fps / frames_per_second if frames_per_second and fps > 0 else sample_rate
+    if detection is not None:
+        sample_step *= detection.stride
+    trackers.open(unique_id, detection_interval=max(1, int(round(sample_step))))
     try:
         # Process frames for shot classification
         shot_type = None
         confidence = 0
-
-        if len(frames) > 0:
-            # Use the shot classifier to detect the shot type
-            from utils.shot_classification import ShotClassifier
-            classifier = ShotClassifier()
+        events = []
+
+        # Use the shot classifier to detect the shot type while frames are decoded
+        from utils.shot_classification import get_classifier
+        classifier = get_classifier()
+        if export_frames is None:
+            export_frames = EXPORT_FRAMES
+        if export_frames:
+            # Annotated frames are written off the request path by a background thread
+            frames_dir = os.path.join('static/frames', os.path.basename(input_path).split('.')[0])
+            with FrameExporter(frames_dir) as exporter:
+                shot_type, confidence = classifier.classify_frame_sequence(frames, on_frame=exporter.submit)
+        else:
             shot_type, confidence = classifier.classify_frame_sequence(frames)
 
+        # Drain whatever the classifier did not consume so frame counts are complete
+        for _ in frames:
+            pass
+        # Timestamp sampling stops at the last sample, so fall back to the container's count
+        frame_count = max(stats['decoded'], total_frames) if frames_per_second else stats['decoded']
+        logger.debug(f"Decoded {frame_count} frames, classified {stats['sampled']}")
+        timings['decode_classify'] = time.perf_counter() - started
+        metrics.FRAMES_DECODED.inc(stats['decoded'])
+        metrics.FRAMES_SAMPLED.inc(stats['sampled'])
+
+        if stats['sampled'] > 0:
             # Map shot types to commentary templates
             shot_type_mapping = {
                 'cover_drive': 'cover_drive',
@@ -78,12 +388,6 @@ def process_video(input_path, output_path, sample_rate=3, unique_id=None, langua
             # Get the correct template type
             template_type = shot_type_mapping.get(shot_type, 'generic')
 
-            # Save frames with detected shot label
-            for i, frame in enumerate(frames):
-                frame_path = os.path.join(frames_dir, f'frame_{i:04d}.jpg')
-                cv2.putText(frame, template_type, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                cv2.imwrite(frame_path, frame)
-
             # Generate events with proper shot type
             events = []
 
@@ -105,87 +409,91 @@ def process_video(input_path, output_path, sample_rate=3, unique_id=None, langua
                 'frame': frame_count // 2 + 15
             })
 
-            # Store boundary in session
-            from flask import session, redirect, url_for
-            if 'boundaries' not in session:
-                session['boundaries'] = {'four': 1, 'six': 0}
-            session['boundaries']['four'] = 1  # Set to 1 for pull shot
-
+        # Add what the ball tracker picked up, in match order
+        events.extend(tracking.events)
+        events.sort(key=lambda event: event['timestamp'])
 
         # Get video duration and events with timestamps
         # Generate natural flowing commentary for all events together with language support
-        commentary = generate_commentary(events, language=language)
+        if progress:
+            progress('Generating commentary...', 65)
+        with metrics.timer('commentary'):
+            commentary = generate_commentary(events, language=language)
 
-        # Setup paths with absolute paths
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        processed_video_path = os.path.join(base_dir, 'static', 'results', f'processed_{unique_id}.mp4')
-        commentary_audio_path = os.path.join(base_dir, 'static', 'results', f'commentary_{unique_id}.mp3')
-        final_output_path = os.path.join(base_dir, 'static', 'results', f'final_{unique_id}.mp4')
+        # All outputs go next to output_path
+        results_dir = os.path.dirname(os.path.abspath(output_path))
+        processed_video_path = os.path.abspath(output_path)
+        commentary_audio_path = os.path.join(results_dir, f'commentary_{unique_id}.mp3')
+        final_output_path = os.path.join(results_dir, f'final_{unique_id}.mp4')
 
         # Ensure results directory exists
-        os.makedirs(os.path.dirname(processed_video_path), exist_ok=True)
-
-        # First copy the video
-        shutil.copy2(input_path, processed_video_path)
-
-        # Generate commentary audio and merge with video
-        if os.path.exists(commentary_audio_path):
+        os.makedirs(results_dir, exist_ok=True)
+
+        result = VideoProcessingResult(
+            events=events,
+            commentary=commentary,
+            processed_video=processed_video_path if link_video else None,
+            shot_type=shot_type,
+            confidence=float(confidence),
+            duration=duration,
+            frame_count=frame_count,
+            sampled_frames=stats['sampled'],
+            detections=detection.summary() if detection is not None else {},
+            timings=timings
+        )
+
+        # Synthesize the commentary audio in the background.
+        # The audio file only appears once it is complete, and the future signals when.
+        from utils.text_to_speech import text_to_speech_async
+        stage_started = time.perf_counter()
+        audio_ready = text_to_speech_async(commentary, commentary_audio_path, language=language, backend=tts_backend)
+
+        # Expose the upload as the processed video; a hardlink avoids copying the whole file
+        if link_video:
+            link_or_copy(input_path, processed_video_path)
+
+        # Merge the commentary audio as soon as it is ready
+        if progress:
+            progress('Generating commentary audio...', 75)
+        if audio_ready.result():
+            timings['tts'] = time.perf_counter() - stage_started
+            metrics.STAGE_SECONDS.observe(timings['tts'], stage='tts')
+            result.commentary_audio = commentary_audio_path
             logger.info("Merging video with commentary audio...")
+            if progress:
+                progress('Merging commentary audio...', 85)
             from utils.align_media import align_media
-            
-            # Ensure audio file is complete before merging
-            while True:
-                try:
-                    with open(commentary_audio_path, 'rb') as f:
-                        f.seek(-128, 2)  # Check if file is complete
-                    break
-                except:
-                    time.sleep(0.1)  # Wait for audio generation to complete
-
-            max_retries = 3
-            retry_count = 0
-
-            while retry_count < max_retries:
-                try:
-                    success = align_media(processed_video_path, commentary_audio_path, final_output_path)
-                    if success:
-                        logger.info("Successfully merged video and audio")
-
-                        # Verify the output
-                        if os.path.exists(final_output_path) and os.path.getsize(final_output_path) > 0:
-                            session['processing_results'] = {
-                                'processed_video': processed_video_path,
-                                'commentary_audio': commentary_audio_path,
-                                'merged_video': final_output_path if os.path.exists(final_output_path) else None,
-                                'events': events,
-                                'commentary': commentary
-                            }
-                            return events, final_output_path, commentary
-
-                        logger.warning("Output file verification failed, retrying...")
-                    else:
-                        logger.warning(f"Merge attempt {retry_count + 1} failed")
-
-                except Exception as e:
-                    logger.error(f"Error during merge attempt {retry_count + 1}: {str(e)}")
-
-                retry_count += 1
-
-            logger.warning("Failed to merge audio after all retries, returning video without commentary")
-
-        logger.info(f"Video processed and saved to {processed_video_path}")
-        session['processing_results'] = {
-            'processed_video': processed_video_path,
-            'commentary_audio': commentary_audio_path,
-            'merged_video': final_output_path if os.path.exists(final_output_path) else None,
-            'events': events,
-            'commentary': commentary
-        }
-        return events, processed_video_path, commentary
+
+            stage_started = time.perf_counter()
+            try:
+                # Mux straight from the original upload in a single ffmpeg pass
+                success = align_media(input_path, commentary_audio_path, final_output_path)
+            except Exception as e:
+                logger.error(f"Error during merge: {str(e)}")
+                success = False
+
+            timings['merge'] = time.perf_counter() - stage_started
+
+            # Verify the output
+            if success and os.path.exists(final_output_path) and os.path.getsize(final_output_path) > 0:
+                logger.info("Successfully merged video and audio")
+                result.merged_video = final_output_path
+                timings['total'] = time.perf_counter() - started
+                return result
+
+            logger.warning("Failed to merge audio, returning video without commentary")
+        else:
+            logger.warning("Commentary audio could not be generated, returning video without commentary")
+
+        logger.info(f"Video processed, outputs saved to {results_dir}")
+        timings['total'] = time.perf_counter() - started
+        return result
 
     except Exception as e:
         logger.error(f"Error processing video: {str(e)}")
         raise
+    finally:
+        trackers.close(unique_id)
 
 def generate_simulated_events():
     """